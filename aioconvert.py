@@ -0,0 +1,247 @@
+"""
+aioconvert.py
+
+asyncio API for embedding the converter in a service:
+
+    from aioconvert import convert
+
+    gif_bytes = await convert(url, start=10, duration=5)
+    path = await convert(url, 10, 5, output="clip.gif", timeout=60)
+    await convert(url, 10, 5, output=response)  # anything with .write()
+
+yt-dlp and ffmpeg run as asyncio subprocesses, so one event loop can
+supervise hundreds of conversions (bound them with an asyncio.Semaphore
+if needed). Cancelling the task or hitting the timeout kills the running
+child process and removes the temporary files. Failures raise
+youtube2gif.ConversionError; nothing calls sys.exit().
+"""
+
+import io
+import os
+import shutil
+import asyncio
+import inspect
+import contextlib
+import tempfile
+
+import gifenc
+from formats import FormatPolicy
+from messages import text
+from options import RenderOptions, from_mapping
+from youtube2gif import (ConversionError, PIPE, PPM, STREAM_CHUNK, which,
+                         probe_command, parse_info, download_command,
+                         section_command, gif_commands, raw_frames_command,
+                         palette_sample_command, ppm_size)
+
+async def run_async(cmd, capture=False):
+    """
+    Run cmd, returning its stdout if capture is set. Raises ConversionError
+    on a non-zero exit. If the awaiting task is cancelled the process is
+    killed before the cancellation propagates.
+    """
+    proc = await asyncio.create_subprocess_exec(
+        *cmd,
+        stdin=asyncio.subprocess.DEVNULL,
+        stdout=asyncio.subprocess.PIPE if capture else asyncio.subprocess.DEVNULL,
+        stderr=asyncio.subprocess.PIPE)
+    try:
+        out, err = await proc.communicate()
+    except asyncio.CancelledError:
+        if proc.returncode is None:
+            proc.kill()
+            await proc.wait()
+        raise
+    if proc.returncode != 0:
+        detail = err.decode("utf-8", "replace").strip().splitlines()[-1:]
+        raise ConversionError(" ".join([text("command_failed",
+                                             cmd=" ".join(cmd),
+                                             rc=proc.returncode)] + detail))
+    return out
+
+async def stream_async(cmd, out, data=None, chunk_size=STREAM_CHUNK):
+    """
+    Run cmd with data on stdin and pass its stdout to out.write() chunk by
+    chunk as it is produced; out.write() may be a coroutine function.
+    """
+    proc = await asyncio.create_subprocess_exec(
+        *cmd,
+        stdin=asyncio.subprocess.PIPE if data else asyncio.subprocess.DEVNULL,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.DEVNULL)
+    try:
+        if data:
+            proc.stdin.write(data)
+            await proc.stdin.drain()
+            proc.stdin.close()
+        while True:
+            chunk = await proc.stdout.read(chunk_size)
+            if not chunk:
+                break
+            await write_async(out, chunk)
+        await proc.wait()
+    except BaseException:
+        if proc.returncode is None:
+            proc.kill()
+            await proc.wait()
+        raise
+    if proc.returncode != 0:
+        raise ConversionError(text("command_failed", cmd=" ".join(cmd),
+                                   rc=proc.returncode))
+
+async def write_async(out, data):
+    res = out.write(data)
+    if inspect.isawaitable(res):
+        await res
+
+async def frames_async(cmd, size):
+    """
+    Yield the size-byte frames of a raw_frames_command() as they are
+    decoded. The process is killed if the consumer stops or is cancelled.
+    """
+    proc = await asyncio.create_subprocess_exec(
+        *cmd,
+        stdin=asyncio.subprocess.DEVNULL,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.DEVNULL)
+    try:
+        while True:
+            try:
+                yield await proc.stdout.readexactly(size)
+            except asyncio.IncompleteReadError:
+                break
+        await proc.wait()
+    finally:
+        if proc.returncode is None:
+            proc.kill()
+            await proc.wait()
+    if proc.returncode != 0:
+        raise ConversionError(text("command_failed", cmd=" ".join(cmd),
+                                   rc=proc.returncode))
+
+async def python_gif_async(ffmpeg, mp4, start, duration, out, threads=None,
+                           opts=None):
+    """
+    Async counterpart of youtube2gif.python_gif(): ffmpeg runs as an
+    asyncio subprocess and each frame is encoded in a worker thread, so a
+    cancellation stops both between two frames. out is a binary writable
+    whose write() may be a coroutine function.
+    """
+    opts = opts or RenderOptions()
+    probe = await run_async(raw_frames_command(ffmpeg, mp4, start, duration,
+                                               opts=opts, frames=1, fmt=PPM),
+                            capture=True)
+    if ppm_size(probe) is None:
+        raise ConversionError(f"no frames decoded from {mp4}")
+    width, height = ppm_size(probe)
+    size = width * height * 3
+    async with contextlib.aclosing(frames_async(
+            palette_sample_command(ffmpeg, mp4, start, duration, threads,
+                                   opts=opts), size)) as frames:
+        sample = [frame async for frame in frames]
+    if not sample:
+        raise ConversionError(f"no frames decoded from {mp4}")
+    palette = await asyncio.to_thread(gifenc.palette_for, sample,
+                                      opts.max_colors)
+    del sample
+
+    buf = io.BytesIO()
+    encoder = gifenc.Encoder(buf, width, height, opts.fps, palette)
+    async with contextlib.aclosing(frames_async(raw_frames_command(
+            ffmpeg, mp4, start, duration, threads, opts=opts), size)) as frames:
+        async for frame in frames:
+            await asyncio.to_thread(encoder.add, frame)
+            if buf.tell():
+                await write_async(out, buf.getvalue())
+                buf.seek(0)
+                buf.truncate()
+    encoder.close()
+    await write_async(out, buf.getvalue())
+
+async def probe_info_async(yt, url):
+    """Return the yt-dlp info dict of url (empty on failure)."""
+    try:
+        return parse_info(await run_async(probe_command(yt, url), capture=True))
+    except ConversionError:
+        return {}
+
+async def fetch_source_async(yt, ffmpeg, url, fmt, start, duration, mp4,
+                             full_download=False):
+    """Async counterpart of youtube2gif.fetch_source()."""
+    if fmt and not full_download and FormatPolicy.is_seekable(fmt):
+        cmd, offset = section_command(ffmpeg, fmt["url"], start, duration, mp4)
+        try:
+            await run_async(cmd)
+            if os.path.getsize(mp4) > 0:
+                return offset
+        except (ConversionError, OSError):
+            pass
+        # yt-dlp would take a partial file left here as already downloaded
+        if os.path.exists(mp4):
+            os.remove(mp4)
+    await run_async(download_command(yt, url, mp4,
+                                     fmt["format_id"] if fmt else "bestvideo/best"))
+    return start
+
+async def _convert(url, start, duration, output, two_pass, threads,
+                   full_download, policy, opts, yt, ffmpeg):
+    yt = yt or which("yt-dlp")
+    ffmpeg = ffmpeg or which("ffmpeg")
+    opts = opts or RenderOptions()
+    policy = policy or FormatPolicy(target_width=opts.width)
+
+    tmpdir = tempfile.mkdtemp(prefix="yt2gif_")
+    try:
+        mp4 = os.path.join(tmpdir, "video.mp4")
+        pal = os.path.join(tmpdir, "palette.png")
+        gif = output if isinstance(output, str) else os.path.join(tmpdir, "out.gif")
+
+        info = await probe_info_async(yt, url)
+        fmt = policy.select(info.get("formats") or [])
+        offset = await fetch_source_async(yt, ffmpeg, url, fmt, start,
+                                          duration, mp4, full_download)
+        if opts.encoder == "python" and hasattr(output, "write"):
+            await python_gif_async(ffmpeg, mp4, offset, duration, output,
+                                   threads=threads, opts=opts)
+        elif opts.encoder == "python":
+            with open(gif, "wb") as f:
+                await python_gif_async(ffmpeg, mp4, offset, duration, f,
+                                       threads=threads, opts=opts)
+        elif hasattr(output, "write"):
+            # stream the GIF; a two-pass palette stays in memory
+            cmds = gif_commands(ffmpeg, mp4, offset, duration, PIPE, PIPE,
+                                two_pass=two_pass, threads=threads, opts=opts)
+            palette = await run_async(cmds[0], capture=True) if two_pass else None
+            await stream_async(cmds[-1], output, palette)
+        else:
+            for cmd in gif_commands(ffmpeg, mp4, offset, duration, pal, gif,
+                                    two_pass=two_pass, threads=threads,
+                                    opts=opts):
+                await run_async(cmd)
+
+        if output:
+            return output
+        with open(gif, "rb") as f:
+            return f.read()
+    finally:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+
+async def convert(url, start=0.0, duration=5.0, output=None, two_pass=False,
+                  threads=None, full_download=False, timeout=None,
+                  policy=None, opts=None, yt=None, ffmpeg=None):
+    """
+    Convert [start, start+duration] seconds of url into a GIF.
+
+    Returns output if given (a path to write, or a writable the GIF is
+    streamed into as ffmpeg produces it), otherwise the GIF bytes.
+    Raises asyncio.TimeoutError after timeout seconds and ConversionError
+    if a tool is missing or a step fails. opts is a RenderOptions (or a
+    dict of its fields); yt and ffmpeg may be passed to skip the PATH
+    lookups.
+    """
+    if isinstance(opts, dict):
+        opts = from_mapping(opts)
+    job = _convert(url, float(start), float(duration), output, two_pass,
+                   threads, full_download, policy, opts, yt, ffmpeg)
+    if timeout is None:
+        return await job
+    return await asyncio.wait_for(job, timeout)
@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+"""
+batch.py
+
+Render many GIFs from one manifest in a single process.
+Clips are grouped by source video, so each video is probed and downloaded
+once (only the span covering all its clips) and then every clip is cut
+from the local copy. Videos are downloaded and clips encoded concurrently,
+with separate limits for both.
+
+Usage:
+    python3 batch.py MANIFEST [--cache-dir [DIR]] [--full-download]
+                     [--download-slots N] [--encode-slots N] [--threads N]
+                     [--metrics FILE] [--metrics-prom FILE]
+                     [--progress] [--stall-timeout SEC]
+
+The manifest is either a JSON list of objects or a CSV file with a header:
+    url, start, duration, output[, outputs][, option columns...]
+JSON entries may carry their options in an "options" object; in CSV every
+extra column is an option. outputs lists further files rendered from the
+same decode as the GIF: .webp, .png (APNG) or .mp4, as a JSON list or a
+quoted, comma-separated CSV value (see renditions.py). Supported options:
+two_pass and the render options of options.py (fps, width, scaler,
+max_colors, stats_mode, dither, diff_mode, encoder).
+
+Example manifest.csv:
+    url,start,duration,output,outputs
+    https://youtu.be/kX8hfK0PrHM,10,5,intro.gif,
+    https://youtu.be/kX8hfK0PrHM,42,3,reaction.gif,"reaction.webp,reaction.mp4"
+"""
+
+import os
+import sys
+import csv
+import json
+import shutil
+import tempfile
+import argparse
+import contextlib
+import concurrent.futures
+
+import metrics
+import progress
+from cache import normalize_url
+from formats import FormatPolicy
+from options import from_mapping
+from renditions import parse_outputs
+from youtube2gif import (ConversionError, die, which, parse_time, open_source,
+                         make_gif, make_gif_from_library, render_outputs,
+                         joins_outputs,
+                         plan_seek, render_params, add_cache_arguments,
+                         open_caches)
+from scheduler import Scheduler
+from palettes import PaletteLibrary, library_dir, DEFAULT_THRESHOLD
+
+FIELDS = ("url", "start", "duration", "output", "outputs")
+
+def parse_bool(value):
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in ("1", "true", "yes", "on")
+
+def read_entries(path):
+    """Return the raw manifest entries of a .json or .csv file."""
+    with open(path, newline="") as f:
+        if path.lower().endswith(".json"):
+            data = json.load(f)
+            return data.get("jobs", []) if isinstance(data, dict) else data
+        return list(csv.DictReader(f))
+
+def load_manifest(path):
+    """Return the clips of a manifest as normalized dicts."""
+    clips = []
+    for i, entry in enumerate(read_entries(path)):
+        options = dict(entry.get("options") or {})
+        options.update({k: v for k, v in entry.items()
+                        if k not in FIELDS and k != "options" and v not in ("", None)})
+        if not entry.get("url"):
+            raise ValueError(f"{path}: entry {i + 1} has no url")
+        if None in entry:
+            # csv.DictReader keeps the fields past the header under None
+            raise ValueError(f"{path}: entry {i + 1} has more fields than "
+                             f"the header")
+        try:
+            opts = from_mapping(options)
+            outputs = parse_outputs(entry.get("outputs"))
+        except ValueError as e:
+            raise ValueError(f"{path}: entry {i + 1}: {e}")
+        clips.append({
+            "url": entry["url"].strip(),
+            "start": parse_time(entry.get("start") or 0),
+            "duration": parse_time(entry.get("duration") or 5),
+            "output": entry.get("output") or f"clip_{i + 1:04d}.gif",
+            "two_pass": parse_bool(options.get("two_pass", False)),
+            "opts": opts,
+            "outputs": outputs,
+        })
+    return clips
+
+def group_by_source(clips):
+    """Return {source: [clips]} in manifest order."""
+    groups = {}
+    for clip in clips:
+        groups.setdefault(normalize_url(clip["url"]), []).append(clip)
+    return groups
+
+def clip_params(clip, palette_threshold=None):
+    return render_params(clip["url"], clip["start"], clip["duration"],
+                         clip["two_pass"], clip["opts"],
+                         palette_threshold=palette_threshold)
+
+def render_group(yt, ffmpeg, clips, scheduler, cache=None, results=None,
+                 full_download=False, palette_threshold=None):
+    """
+    Render all clips of one source video from a single download, encoding
+    them concurrently on the scheduler's encode slots. With a
+    palette_threshold the clips share a palettes.PaletteLibrary.
+    Returns (rendered, cached, failed) counts of the clips; a failed clip
+    is reported and does not stop the others. The result cache holds
+    GIFs only and so is skipped for clips with further outputs.
+    """
+    pending = []
+    cached = failed = 0
+    for clip in clips:
+        usable = results is not None and not clip["outputs"]
+        params = clip_params(clip, palette_threshold)
+        hit = results.get(params) if usable else None
+        if not hit:
+            pending.append(clip)
+            continue
+        try:
+            shutil.copyfile(hit, clip["output"])
+        except OSError as e:
+            print(f"ERROR: {clip['output']}: {e}", file=sys.stderr)
+            failed += 1
+            continue
+        print(f"✔ {clip['output']} (cached)")
+        cached += 1
+    if not pending:
+        return 0, cached, failed
+
+    def encode(i, clip, mp4, offset, threads=None):
+        pal = os.path.join(tmpdir, f"palette_{i}.png")
+        start = offset + clip["start"] - span_start
+        outputs = clip["outputs"]
+        with metrics.job(clip["output"]):
+            seek = plan_seek(mp4, start)
+            shared = joins_outputs(outputs, clip["opts"], clip["two_pass"],
+                                   palette_reuse=library is not None)
+            if shared:
+                render_outputs(ffmpeg, mp4, start, clip["duration"],
+                               [(clip["output"], "gif")] + outputs,
+                               threads=threads, seek=seek, opts=clip["opts"])
+            elif library is not None:
+                make_gif_from_library(ffmpeg, mp4, start, clip["duration"],
+                                      clip["output"], library, threads=threads,
+                                      seek=seek, opts=clip["opts"])
+            else:
+                make_gif(ffmpeg, mp4, start, clip["duration"], pal,
+                         clip["output"], two_pass=clip["two_pass"],
+                         threads=threads, seek=seek, opts=clip["opts"])
+            if outputs and not shared:
+                render_outputs(ffmpeg, mp4, start, clip["duration"], outputs,
+                               threads=threads, seek=seek, opts=clip["opts"])
+        if results is not None and not outputs:
+            results.put(clip_params(clip, palette_threshold), clip["output"])
+        for path in [clip["output"]] + [path for path, _ in outputs]:
+            print(f"✔ {path}")
+
+    span_start = min(c["start"] for c in pending)
+    span_end = max(c["start"] + c["duration"] for c in pending)
+    policy = FormatPolicy(target_width=max(c["opts"].width for c in pending))
+    tmpdir = tempfile.mkdtemp(prefix="yt2gif_")
+    try:
+        with contextlib.ExitStack() as stack:
+            with scheduler.download_slot(), metrics.job(pending[0]["url"]):
+                mp4, offset = stack.enter_context(open_source(
+                    yt, ffmpeg, pending[0]["url"], span_start,
+                    span_end - span_start, tmpdir,
+                    full_download=full_download, policy=policy, cache=cache))
+            library = None
+            if palette_threshold is not None:
+                library = PaletteLibrary(library_dir(mp4), palette_threshold)
+            futures = [scheduler.encode(encode, i, clip, mp4, offset)
+                       for i, clip in enumerate(pending)]
+            # the source and tmpdir must outlive every encode, failed or not
+            concurrent.futures.wait(futures)
+    finally:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+    rendered = 0
+    for clip, future in zip(pending, futures):
+        error = future.exception()
+        if error is None:
+            rendered += 1
+        else:
+            print(f"ERROR: {clip['output']}: {error}", file=sys.stderr)
+            failed += 1
+    return rendered, cached, failed
+
+def run_batch(yt, ffmpeg, clips, scheduler, cache=None, results=None,
+              full_download=False, palette_threshold=None):
+    """Render every clip; returns (rendered, cached, failed) counts."""
+    rendered = cached = failed = 0
+    groups = group_by_source(clips)
+    futures = {source: scheduler.submit(render_group, yt, ffmpeg, group,
+                                        scheduler, cache=cache,
+                                        results=results,
+                                        full_download=full_download,
+                                        palette_threshold=palette_threshold)
+               for source, group in groups.items()}
+    for source, future in futures.items():
+        group = groups[source]
+        try:
+            counts = future.result()
+        except (ConversionError, OSError) as e:
+            # report the error; the other videos carry on
+            print(f"ERROR: {e}\nERROR: skipping {len(group)} clip(s) of {source}",
+                  file=sys.stderr)
+            failed += len(group)
+            continue
+        rendered += counts[0]
+        cached += counts[1]
+        failed += counts[2]
+    return rendered, cached, failed
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="batch.py",
+        description="Render many GIFs from a JSON/CSV manifest"
+    )
+    parser.add_argument("manifest", help="JSON or CSV manifest of clips")
+    parser.add_argument("--full-download", action="store_true",
+                        help="download whole videos instead of the needed span")
+    parser.add_argument("--download-slots", type=int, default=4,
+                        help="videos downloaded at the same time (default: 4)")
+    parser.add_argument("--encode-slots", type=int,
+                        help="GIFs encoded at the same time (default: cores / 2)")
+    parser.add_argument("--threads", type=int,
+                        help="threads per ffmpeg encode "
+                             "(default: cores / encode slots)")
+    parser.add_argument("--palette-reuse", type=float, nargs="?",
+                        const=DEFAULT_THRESHOLD, metavar="THRESHOLD",
+                        help="share palettes between clips of a video whose colors "
+                             "differ by at most THRESHOLD (0-1, default "
+                             f"{DEFAULT_THRESHOLD})")
+    add_cache_arguments(parser)
+    metrics.add_arguments(parser)
+    progress.add_arguments(parser)
+    args = parser.parse_args()
+    metrics.install_from_args(args)
+    progress.install_from_args(args)
+
+    try:
+        clips = load_manifest(args.manifest)
+    except (OSError, ValueError, KeyError) as e:
+        die(e)
+
+    try:
+        yt     = which("yt-dlp")
+        ffmpeg = which("ffmpeg")
+    except ConversionError as e:
+        die(e)
+
+    cache, results = open_caches(args)
+
+    with Scheduler(args.download_slots, args.encode_slots,
+                   args.threads) as scheduler:
+        rendered, cached, failed = run_batch(yt, ffmpeg, clips, scheduler,
+                                             cache=cache, results=results,
+                                             full_download=args.full_download,
+                                             palette_threshold=args.palette_reuse)
+    sources = len(group_by_source(clips))
+    print(f"\n{rendered} rendered, {cached} cached, {failed} failed "
+          f"({len(clips)} clips from {sources} videos)")
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,349 @@
+#!/usr/bin/env python3
+"""
+bench.py
+
+Benchmark the conversion pipeline on local fixture clips, stage by stage.
+The clips are generated with ffmpeg's testsrc, mandelbrot and (static)
+smptebars sources, so no network is needed; the download stage is stood
+in for by the section fetch (stream copy) from the local fixture.
+
+For every combination of source, resolution, duration, fps and width the
+stages are timed separately:
+    download     section fetch of the slice from the fixture
+    palette      palettegen (first command of --two-pass)
+    encode       paletteuse with that palette (second command of --two-pass)
+    single-pass  palette and GIF from one decode (the default pipeline)
+    python       with --python-encoder: raw frame decode plus the in-process
+                 encoder of gifenc.py (its cpu includes this process)
+Each is run --repeat times and the fastest run is kept. --json writes
+the results in a stable order, so runs of two versions can be diffed.
+--baseline FILE turns the run into a regression check against such a
+file: the exit status is 1 if any case got larger by more than
+--tolerance or slower by more than --time-tolerance (fractions).
+--scaling 1,2,4 instead times the segment-parallel encoder of
+--parallel on one long clip (--scaling-duration seconds, of the first
+source and resolution) with each process count, and reports the speedup
+and efficiency against the first count.
+--startup instead measures the start of the main.py launcher in process
+against the former dispatch to a second interpreter per GIF.
+
+Usage:
+    python3 bench.py [--sources testsrc,mandelbrot,smptebars] [--resolutions 480,720]
+                     [--durations 2,5] [--fps 10,15] [--widths 320,480]
+                     [--repeat N] [--json FILE|-] [--python-encoder]
+                     [--baseline FILE] [--tolerance F] [--time-tolerance F]
+                     [--scaling 1,2,4 [--scaling-duration SEC]] [--startup]
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import tempfile
+import argparse
+import resource
+import subprocess
+
+import youtube2gif
+from options import RenderOptions
+from youtube2gif import (which, run, section_command, gif_commands, python_gif,
+                         segmented_gif)
+
+# lavfi sources of the fixture clips, by name
+SOURCES = {
+    "testsrc": "testsrc=size={size}:rate=30",
+    "mandelbrot": "mandelbrot=size={size}:rate=30",
+    # static frames: the worst case for full-frame GIFs
+    "smptebars": "smptebars=size={size}:rate=30",
+}
+
+# frame size of each fixture resolution
+RESOLUTIONS = {
+    360: "640x360",
+    480: "854x480",
+    720: "1280x720",
+    1080: "1920x1080",
+}
+
+# launcher start-up: main.py running the engine in process, and the former
+# dispatch, which started a second interpreter for the language script
+MAIN = os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py")
+DISPATCH = "import subprocess, sys; sys.exit(subprocess.call([sys.executable] + sys.argv[1:]))"
+STARTUP_MODES = [
+    ("in-process", [sys.executable, MAIN]),
+    ("subprocess", [sys.executable, "-c", DISPATCH, MAIN]),
+]
+STARTUP_ARGS = ["--lang", "italian", "--help"]
+
+def make_fixture(ffmpeg, source, duration, mp4):
+    """Render a synthetic H.264 clip of the given duration."""
+    run([ffmpeg,
+         "-v", "warning",
+         "-f", "lavfi",
+         "-i", source,
+         "-t", str(duration),
+         "-c:v", "libx264", "-pix_fmt", "yuv420p",
+         "-y", mp4])
+
+def child_cpu():
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+def total_cpu():
+    """CPU seconds of this process and its finished children."""
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime + child_cpu()
+
+def measure(fn, repeat, cpu_clock=child_cpu):
+    """Return the best (wall, cpu) seconds of fn() over repeat runs."""
+    best = None
+    for _ in range(repeat):
+        wall, cpu = time.perf_counter(), cpu_clock()
+        fn()
+        sample = (time.perf_counter() - wall, cpu_clock() - cpu)
+        best = sample if best is None or sample[0] < best[0] else best
+    return best
+
+def number_list(value):
+    return [float(v) if "." in v else int(v) for v in value.split(",") if v]
+
+def name_list(value):
+    return [v for v in value.split(",") if v]
+
+def stage_commands(ffmpeg, fixture, duration, opts, tmpdir):
+    """Return [(stage, command, output)] of one benchmark case."""
+    mp4 = os.path.join(tmpdir, "slice.mp4")
+    pal = os.path.join(tmpdir, "palette.png")
+    gif = os.path.join(tmpdir, "out.gif")
+    fetch, offset = section_command(ffmpeg, fixture, 0.0, duration, mp4)
+    palette, encode = gif_commands(ffmpeg, mp4, offset, duration, pal, gif,
+                                   two_pass=True, opts=opts)
+    single, = gif_commands(ffmpeg, mp4, offset, duration, pal, gif, opts=opts)
+    return [("download", fetch, mp4), ("palette", palette, pal),
+            ("encode", encode, gif), ("single-pass", single, gif)]
+
+def python_stage(ffmpeg, fixture, duration, opts, tmpdir):
+    """(stage, fn, output) of the python encoder, on the download's slice."""
+    mp4 = os.path.join(tmpdir, "slice.mp4")
+    gif = os.path.join(tmpdir, "python.gif")
+    _, offset = section_command(ffmpeg, fixture, 0.0, duration, mp4)
+    opts = opts.replace(encoder="python")
+    return ("python",
+            lambda: python_gif(ffmpeg, mp4, offset, duration, gif, opts=opts),
+            gif)
+
+def bench_matrix(args):
+    """Run every case of the matrix; returns a list of result dicts."""
+    ffmpeg = which("ffmpeg")
+    tmpdir = tempfile.mkdtemp(prefix="yt2gif_bench_")
+    results = []
+    try:
+        for source in args.sources:
+            for resolution in args.resolutions:
+                fixture = os.path.join(tmpdir, f"{source}-{resolution}p.mp4")
+                make_fixture(ffmpeg, SOURCES[source].format(
+                    size=RESOLUTIONS[resolution]), max(args.durations), fixture)
+                for duration in args.durations:
+                    for fps in args.fps:
+                        for width in args.widths:
+                            opts = RenderOptions(fps=fps, width=width)
+                            stages = [(stage, lambda cmd=cmd: run(cmd), out)
+                                      for stage, cmd, out in stage_commands(
+                                          ffmpeg, fixture, duration, opts, tmpdir)]
+                            if args.python_encoder:
+                                stages.append(python_stage(ffmpeg, fixture,
+                                                           duration, opts, tmpdir))
+                            for stage, fn, out in stages:
+                                # the python encoder works in this process
+                                clock = total_cpu if stage == "python" else child_cpu
+                                wall, cpu = measure(fn, args.repeat, clock)
+                                results.append({
+                                    "source": source,
+                                    "resolution": resolution,
+                                    "duration": duration,
+                                    "fps": fps,
+                                    "width": width,
+                                    "stage": stage,
+                                    "wall": round(wall, 4),
+                                    "cpu": round(cpu, 4),
+                                    "bytes": os.path.getsize(out),
+                                })
+    finally:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+    return results
+
+def bench_scaling(args):
+    """Time segmented_gif() with each --scaling process count on one clip."""
+    ffmpeg = which("ffmpeg")
+    tmpdir = tempfile.mkdtemp(prefix="yt2gif_bench_")
+    source, resolution = args.sources[0], args.resolutions[0]
+    duration, fps, width = args.scaling_duration, args.fps[0], args.widths[0]
+    opts = RenderOptions(fps=fps, width=width)
+    results = []
+    try:
+        fixture = os.path.join(tmpdir, f"{source}-{resolution}p.mp4")
+        make_fixture(ffmpeg, SOURCES[source].format(size=RESOLUTIONS[resolution]),
+                     duration, fixture)
+        for processes in args.scaling:
+            gif = os.path.join(tmpdir, f"parallel-{processes}.gif")
+            scratch = tempfile.mkdtemp(dir=tmpdir)
+            wall, cpu = measure(
+                lambda: segmented_gif(ffmpeg, fixture, 0.0, duration, gif,
+                                      processes, scratch, opts=opts),
+                args.repeat)
+            results.append({
+                "source": source,
+                "resolution": resolution,
+                "duration": duration,
+                "fps": fps,
+                "width": width,
+                "stage": f"parallel-{processes}",
+                "processes": processes,
+                "wall": round(wall, 4),
+                "cpu": round(cpu, 4),
+                "bytes": os.path.getsize(gif),
+            })
+    finally:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+    return results
+
+def case_key(result):
+    return tuple(result[k] for k in ("source", "resolution", "duration",
+                                     "fps", "width", "stage"))
+
+def regressions(baseline, results, tolerance, time_tolerance):
+    """Describe every result larger or slower than its baseline case."""
+    base = {case_key(r): r for r in baseline["results"]}
+    found = []
+    for r in results:
+        b = base.get(case_key(r))
+        if b is None:
+            continue
+        name = "/".join(map(str, case_key(r)))
+        if r["bytes"] > b["bytes"] * (1 + tolerance):
+            found.append(f"{name}: {b['bytes']} -> {r['bytes']} bytes")
+        if r["wall"] > b["wall"] * (1 + time_tolerance):
+            found.append(f"{name}: {b['wall']:.2f} -> {r['wall']:.2f} s")
+    return found
+
+def ffmpeg_version(ffmpeg):
+    res = subprocess.run([ffmpeg, "-version"], capture_output=True, text=True)
+    return res.stdout.splitlines()[0] if res.stdout else "unknown"
+
+def write_json(path, args, results):
+    """Write the results with the environment they were measured in."""
+    report = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "ffmpeg": ffmpeg_version(which("ffmpeg")),
+        "repeat": args.repeat,
+        "results": results,
+    }
+    data = json.dumps(report, indent=2, sort_keys=True) + "\n"
+    if path == "-":
+        sys.__stdout__.write(data)
+    else:
+        with open(path, "w") as f:
+            f.write(data)
+
+def print_table(results):
+    print(f"\n{'source':<12}{'res':>6}{'sec':>6}{'fps':>6}{'width':>7}  "
+          f"{'stage':<13}{'wall s':>8}{'cpu s':>8}{'bytes':>10}")
+    for r in results:
+        print(f"{r['source']:<12}{r['resolution']:>5}p{r['duration']:>6}"
+              f"{r['fps']:>6}{r['width']:>7}  {r['stage']:<13}"
+              f"{r['wall']:>8.2f}{r['cpu']:>8.2f}{r['bytes']:>10}")
+
+def print_scaling(results):
+    base = results[0]
+    print(f"\n{results[0]['source']} {results[0]['resolution']}p, "
+          f"{results[0]['duration']}s at {results[0]['fps']} fps, "
+          f"{results[0]['width']} px")
+    print(f"{'processes':>9}{'wall s':>8}{'cpu s':>8}{'speedup':>9}"
+          f"{'efficiency':>12}{'bytes':>10}")
+    for r in results:
+        speedup = base["wall"] / r["wall"] if r["wall"] else 0.0
+        efficiency = speedup * base["processes"] / r["processes"]
+        print(f"{r['processes']:>9}{r['wall']:>8.2f}{r['cpu']:>8.2f}"
+              f"{speedup:>8.2f}x{efficiency:>11.0%}{r['bytes']:>10}")
+
+def bench_startup(repeat):
+    """Print the best start-up time of each launcher mode."""
+    results = []
+    for mode, cmd in STARTUP_MODES:
+        wall, cpu = measure(
+            lambda: subprocess.run(cmd + STARTUP_ARGS, check=True,
+                                   stdout=subprocess.DEVNULL),
+            repeat)
+        results.append((mode, wall, cpu))
+
+    print(f"\n{'launcher':<13}{'wall ms':>9}{'cpu ms':>9}")
+    for mode, wall, cpu in results:
+        print(f"{mode:<13}{wall * 1000:>9.1f}{cpu * 1000:>9.1f}")
+    saved = results[1][1] - results[0][1]
+    print(f"\nsaved per GIF: {saved * 1000:.1f} ms")
+
+def main():
+    parser = argparse.ArgumentParser(prog="bench.py")
+    parser.add_argument("--sources", type=name_list,
+                        default=list(SOURCES),
+                        help=f"fixture sources ({', '.join(SOURCES)})")
+    parser.add_argument("--resolutions", type=number_list, default=[480, 720],
+                        help=f"fixture heights ({', '.join(map(str, RESOLUTIONS))}; "
+                             "default: 480,720)")
+    parser.add_argument("--durations", type=number_list, default=[2, 5],
+                        help="clip durations in seconds (default: 2,5)")
+    parser.add_argument("--fps", type=number_list, default=[10, 15],
+                        help="GIF frame rates (default: 10,15)")
+    parser.add_argument("--widths", type=number_list, default=[320, 480],
+                        help="GIF widths (default: 320,480)")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--json", metavar="FILE",
+                        help="write the results as JSON to FILE (- for stdout)")
+    parser.add_argument("--python-encoder", action="store_true",
+                        help="also time the in-process encoder of gifenc.py")
+    parser.add_argument("--baseline", metavar="FILE",
+                        help="fail if results regressed against this --json file")
+    parser.add_argument("--tolerance", type=float, default=0.05,
+                        help="allowed size growth against --baseline (default: 0.05)")
+    parser.add_argument("--time-tolerance", type=float, default=0.25,
+                        help="allowed slowdown against --baseline (default: 0.25)")
+    parser.add_argument("--scaling", type=number_list, metavar="N,N,...",
+                        help="time the --parallel encoder with these process counts")
+    parser.add_argument("--scaling-duration", type=float, default=60.0, metavar="SEC",
+                        help="length of the --scaling clip (default: 60)")
+    parser.add_argument("--startup", action="store_true",
+                        help="benchmark the launcher start-up instead of encoding")
+    args = parser.parse_args()
+
+    if args.startup:
+        return bench_startup(max(args.repeat, 10))
+    if args.scaling and not all(isinstance(n, int) and n > 0 for n in args.scaling):
+        parser.error("--scaling takes positive whole process counts")
+
+    unknown = [s for s in args.sources if s not in SOURCES] + \
+              [r for r in args.resolutions if r not in RESOLUTIONS]
+    if unknown:
+        parser.error(f"unknown fixture: {', '.join(map(str, unknown))}")
+
+    if args.json == "-":
+        # keep the progress and the tools' output off the JSON
+        sys.stdout = youtube2gif.TOOL_STDOUT = sys.stderr
+    results = bench_scaling(args) if args.scaling else bench_matrix(args)
+    if args.json:
+        write_json(args.json, args, results)
+    if args.json != "-":
+        (print_scaling if args.scaling else print_table)(results)
+    if args.baseline:
+        with open(args.baseline) as f:
+            found = regressions(json.load(f), results, args.tolerance,
+                                args.time_tolerance)
+        for line in found:
+            print(f"regression: {line}", file=sys.stderr)
+        return 1 if found else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
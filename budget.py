@@ -0,0 +1,134 @@
+"""
+budget.py
+
+Fit a GIF into a maximum file size.
+
+A cheap low-resolution sample encode of the clip calibrates a simple size
+model (bytes grow with width^2, fps and duration, and shrink with fewer
+colors or lighter dithering). Candidate settings are then tried from the
+best looking one the model expects to fit; after every full encode the
+model is re-calibrated with the real size, so a budget is usually hit in
+one or two full encodes.
+"""
+
+import os
+
+# the sample encode: this wide, at most this many seconds long
+SAMPLE_WIDTH = 96
+SAMPLE_SECONDS = 3.0
+
+# how far each setting may be lowered, relative to the requested options
+WIDTH_STEPS = (1.0, 0.875, 0.75, 0.625, 0.5, 0.4, 0.3)
+FPS_STEPS = (1.0, 0.8, 0.6, 0.5)
+COLOR_STEPS = (256, 128, 64, 32)
+DITHER_STEPS = ("sierra2_4a", "bayer", "none")
+
+# rough relative output size and perceived quality of each setting
+COLOR_SIZE = {256: 1.0, 128: 0.88, 64: 0.76, 32: 0.64}
+COLOR_QUALITY = {256: 1.0, 128: 0.93, 64: 0.8, 32: 0.6}
+DITHER_SIZE = {"sierra2_4a": 1.0, "bayer": 0.85, "none": 0.7}
+DITHER_QUALITY = {"sierra2_4a": 1.0, "bayer": 0.95, "none": 0.85}
+
+# aim this far below the budget to absorb estimation error
+MARGIN = 0.93
+
+def by_colors(table, colors):
+    """Value of a COLOR_* table at colors, interpolated between its steps."""
+    steps = sorted(table)
+    if colors <= steps[0]:
+        return table[steps[0]] * colors / steps[0]
+    for low, high in zip(steps, steps[1:]):
+        if colors <= high:
+            t = (colors - low) / (high - low)
+            return table[low] + t * (table[high] - table[low])
+    return table[steps[-1]]
+
+def model(opts, duration):
+    """Relative size of a GIF with opts (scaled by the calibration)."""
+    return (opts.width ** 2 * opts.fps * duration
+            * by_colors(COLOR_SIZE, opts.max_colors)
+            * DITHER_SIZE.get(opts.dither, 1.0))
+
+def quality(opts, base):
+    """Perceived quality of opts relative to the requested options."""
+    return ((opts.width / base.width) * (opts.fps / base.fps) ** 0.5
+            * by_colors(COLOR_QUALITY, opts.max_colors)
+            * DITHER_QUALITY.get(opts.dither, 1.0))
+
+def tidy(value):
+    """Round to 2 decimals, dropping a zero fraction (10.0 -> 10)."""
+    value = round(value, 2)
+    return int(value) if value == int(value) else value
+
+def candidates(base):
+    """
+    All lowered variants of base, best looking first. The first is base
+    itself: the requested max_colors and dither are kept, and only
+    smaller color steps and lighter dithers are tried after them.
+    """
+    color_steps = [base.max_colors] + [c for c in COLOR_STEPS
+                                        if c < base.max_colors]
+    heaviest = DITHER_SIZE.get(base.dither, 1.0)
+    dither_steps = [base.dither] + [d for d in DITHER_STEPS
+                                    if DITHER_SIZE[d] < heaviest]
+    found = []
+    for w in WIDTH_STEPS:
+        for f in FPS_STEPS:
+            for colors in color_steps:
+                for dither in dither_steps:
+                    found.append(base.replace(
+                        width=max(16, int(round(base.width * w))),
+                        fps=tidy(base.fps * f),
+                        max_colors=colors,
+                        dither=dither))
+    return sorted(found, key=lambda o: quality(o, base), reverse=True)
+
+def fit(encode, duration, max_bytes, base, tmpdir, max_trials=4):
+    """
+    Search settings for a GIF of at most max_bytes.
+
+    encode(opts, duration, path) renders the clip (or, for the sample, its
+    first duration seconds) with opts into path. Returns a dict with the
+    chosen "opts", its "path" and "size", the number of full "trials",
+    and "fits" (False if no trial met the budget; path is then the
+    smallest attempt).
+    """
+    sample_opts = base.replace(width=min(base.width, SAMPLE_WIDTH))
+    sample_seconds = min(duration, SAMPLE_SECONDS)
+    sample_path = os.path.join(tmpdir, "budget_sample.gif")
+    encode(sample_opts, sample_seconds, sample_path)
+    scale = os.path.getsize(sample_path) / model(sample_opts, sample_seconds)
+
+    options = candidates(base)
+    tried = []
+    smallest = None
+    for trial in range(1, max_trials + 1):
+        pick, last_resort = None, False
+        for opts in options:
+            if opts not in tried and scale * model(opts, duration) <= max_bytes * MARGIN:
+                pick = opts
+                break
+        if pick is None:
+            # nothing is expected to fit: try the smallest setting left
+            left = [o for o in options if o not in tried]
+            if not left:
+                break
+            pick = min(left, key=lambda o: model(o, duration))
+            last_resort = True
+        tried.append(pick)
+
+        path = os.path.join(tmpdir, f"budget_{trial}.gif")
+        encode(pick, duration, path)
+        size = os.path.getsize(path)
+        print(f"Budget: trial {trial} {pick} -> {size} bytes "
+              f"(predicted {scale * model(pick, duration):.0f})")
+        if smallest is None or size < smallest["size"]:
+            smallest = {"opts": pick, "path": path, "size": size}
+        if size <= max_bytes:
+            return {"opts": pick, "path": path, "size": size,
+                    "trials": trial, "fits": True}
+        if last_resort:
+            break  # even the smallest setting left is too big
+        # re-calibrate the model with the real size
+        scale = size / model(pick, duration)
+    return {**smallest, "trials": len(tried), "fits": False}
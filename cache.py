@@ -0,0 +1,286 @@
+"""
+cache.py
+
+Persistent on-disk caches: downloaded source videos (SourceCache) and
+finished GIFs (ResultCache).
+
+Entries are content-addressed by (extractor, video id, format id), so every
+GIF cut from the same video reuses one download. The cache is safe to share
+between concurrent jobs:
+
+  * writes go to a temporary file that is atomically renamed into place,
+    so readers never see a partial video;
+  * each entry has a lock file: the downloader holds it exclusively, so a
+    second job waiting for the same video blocks instead of downloading it
+    again, and readers hold it shared so the entry is never evicted while
+    it is being encoded;
+  * when the total size exceeds max_bytes the least recently used entries
+    that nobody is reading are deleted.
+
+Finished GIFs are keyed by a hash of all their normalized render
+parameters, so a repeated request is answered without any download or
+encode.
+"""
+
+import os
+import re
+import json
+import argparse
+import time
+import fcntl
+import shutil
+import hashlib
+import tempfile
+import contextlib
+
+UNITS = {"": 1, "K": 1 << 10, "M": 1 << 20, "G": 1 << 30, "T": 1 << 40}
+
+def parse_size(value):
+    """Convert '500M', '2G', '1.5g' or a plain byte count to bytes."""
+    text = str(value).strip().upper().rstrip("B")
+    unit = text[-1:] if text[-1:] in UNITS else ""
+    return int(float(text[:len(text) - len(unit)]) * UNITS[unit])
+
+def size_argument(value):
+    """parse_size() as an argparse type: bad sizes are usage errors."""
+    try:
+        size = parse_size(value)
+    except ValueError:
+        size = 0
+    if size <= 0:
+        raise argparse.ArgumentTypeError(f"invalid size: {value}")
+    return size
+
+def default_cache_dir():
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+    return os.path.join(base, "yt2gif")
+
+def source_key(info, fmt):
+    """Cache key of a yt-dlp info dict and the selected format dict."""
+    ident = "\0".join([info.get("extractor_key") or "",
+                       str(info.get("id") or info.get("webpage_url") or ""),
+                       str(fmt.get("format_id") or "")])
+    return hashlib.sha256(ident.encode("utf-8")).hexdigest()
+
+class SourceCache:
+    """Size-capped LRU cache of source videos under root."""
+
+    SUFFIX = ".mp4"
+
+    def __init__(self, root, max_bytes=parse_size("2G")):
+        self.root = root
+        self.max_bytes = max_bytes
+        os.makedirs(root, exist_ok=True)
+
+    def path(self, key):
+        return os.path.join(self.root, key + self.SUFFIX)
+
+    def lock_path(self, key):
+        return os.path.join(self.root, key + ".lock")
+
+    @contextlib.contextmanager
+    def open(self, key, fetch):
+        """
+        Yield the path of the cached entry for key, calling fetch(tmp_path)
+        to create it first if it is missing. The entry cannot be evicted
+        until the with-block exits.
+        """
+        path = self.path(key)
+        with open(self.lock_path(key), "a") as lock:
+            # readers of an existing entry share it, even while encoding
+            fcntl.flock(lock, fcntl.LOCK_SH)
+            if not os.path.exists(path):
+                # the upgrade is not atomic: another job may have fetched
+                # the entry meanwhile, so look again under the exclusive lock
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            if os.path.exists(path):
+                os.utime(path)  # mark as recently used
+            else:
+                tmp = os.path.join(self.root,
+                                   f".{key}.{os.getpid()}.tmp{self.SUFFIX}")
+                try:
+                    fetch(tmp)
+                    os.replace(tmp, path)
+                finally:
+                    if os.path.exists(tmp):
+                        os.remove(tmp)
+                self.evict(keep=key)
+            # let other readers in while we use the file
+            fcntl.flock(lock, fcntl.LOCK_SH)
+            yield path
+
+    def entries(self):
+        """Return (mtime, size, key) of all complete entries, oldest first."""
+        found = []
+        for name in os.listdir(self.root):
+            if name.startswith(".") or not name.endswith(self.SUFFIX):
+                continue
+            try:
+                st = os.stat(os.path.join(self.root, name))
+            except FileNotFoundError:
+                continue
+            found.append((st.st_mtime, st.st_size, name[:-len(self.SUFFIX)]))
+        return sorted(found)
+
+    def size(self):
+        return sum(size for _, size, _ in self.entries())
+
+    def evict(self, keep=None):
+        """Delete least recently used, unlocked entries until under the cap."""
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, key in entries:
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            with open(self.lock_path(key), "a") as lock:
+                try:
+                    fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    continue  # in use by another job
+                try:
+                    os.remove(self.path(key))
+                    total -= size
+                except FileNotFoundError:
+                    pass
+                # files derived from the video (e.g. its palette library)
+                shutil.rmtree(os.path.join(self.root, key + ".palettes"),
+                              ignore_errors=True)
+                # the lock file is kept: another job may be about to lock it
+
+YOUTUBE_ID = re.compile(
+    r"(?:youtube\.com/(?:watch\?(?:.*&)?v=|shorts/|embed/|live/)|youtu\.be/)"
+    r"([A-Za-z0-9_-]{11})")
+
+def normalize_url(url):
+    """Map the different spellings of a YouTube URL to one canonical form."""
+    url = url.strip()
+    m = YOUTUBE_ID.search(url)
+    return f"youtube:{m.group(1)}" if m else url
+
+def result_key(params):
+    """Cache key of a dict of render parameters."""
+    params = dict(params)
+    if "url" in params:
+        params["url"] = normalize_url(params["url"])
+    for name, value in params.items():
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            params[name] = round(float(value), 3)
+    blob = json.dumps(params, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+class ResultCache:
+    """
+    Cache of finished GIFs keyed by their render parameters.
+
+    An entry's mtime is its creation time (for the TTL) and its atime is
+    the last time it was served (for LRU eviction above max_bytes).
+    Hit/miss counters are kept per instance and in stats.json, shared by
+    all processes using the same root.
+    """
+
+    SUFFIX = ".gif"
+
+    def __init__(self, root, max_bytes=parse_size("500M"), ttl=None):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(root, exist_ok=True)
+
+    def path(self, key):
+        return os.path.join(self.root, key + self.SUFFIX)
+
+    def expired(self, st, now):
+        return self.ttl is not None and now - st.st_mtime > self.ttl
+
+    def get(self, params):
+        """Return the path of the cached GIF for params, or None on a miss."""
+        path = self.path(result_key(params))
+        now = time.time()
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            st = None
+        if st is None or self.expired(st, now):
+            self.record(hit=False)
+            return None
+        os.utime(path, (now, st.st_mtime))  # mark as recently used
+        self.record(hit=True)
+        return path
+
+    def put(self, params, gif):
+        """Store a copy of gif for params and return the cached path."""
+        path = self.path(result_key(params))
+        # a temporary file of its own: threads of one process put concurrently
+        fd, tmp = tempfile.mkstemp(dir=self.root, prefix=".", suffix=".tmp")
+        os.close(fd)
+        try:
+            shutil.copyfile(gif, tmp)
+            os.replace(tmp, path)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        self.evict()
+        return path
+
+    def entries(self):
+        """Return (atime, size, path, stat) of all entries, least recent first."""
+        found = []
+        for name in os.listdir(self.root):
+            if name.startswith(".") or not name.endswith(self.SUFFIX):
+                continue
+            path = os.path.join(self.root, name)
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            found.append((st.st_atime, st.st_size, path, st))
+        return sorted(found, key=lambda e: e[0])
+
+    def evict(self):
+        """Drop expired entries, then least recently used ones over the cap."""
+        now = time.time()
+        total = 0
+        live = []
+        for atime, size, path, st in self.entries():
+            if self.expired(st, now):
+                self.remove(path)
+            else:
+                live.append((size, path))
+                total += size
+        for size, path in live:
+            if total <= self.max_bytes:
+                break
+            self.remove(path)
+            total -= size
+
+    def remove(self, path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def record(self, hit):
+        """Count a hit or a miss here and in the shared stats file."""
+        if hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+        with open(os.path.join(self.root, ".stats.lock"), "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            stats = self.stats()
+            stats["hits" if hit else "misses"] += 1
+            with open(os.path.join(self.root, "stats.json"), "w") as f:
+                json.dump(stats, f)
+
+    def stats(self):
+        """Return the hit/miss totals of all processes sharing the cache."""
+        try:
+            with open(os.path.join(self.root, "stats.json")) as f:
+                stats = json.load(f)
+        except (FileNotFoundError, ValueError):
+            stats = {}
+        return {"hits": stats.get("hits", 0), "misses": stats.get("misses", 0)}
@@ -0,0 +1,347 @@
+#!/usr/bin/env python3
+"""
+daemon.py
+
+Long-running conversion service. A pool of worker threads stays warm
+(tools looked up once, one scratch directory per worker, shared caches and
+keyframe index) and takes jobs from a persistent SQLite queue; jobs are
+submitted and polled over HTTP on a local Unix socket or TCP port.
+
+Usage:
+    python3 daemon.py [--socket PATH | --port N] [--queue FILE]
+                      [--workers N] [--threads N] [--output-dir DIR]
+                      [--cache-dir [DIR]] [--palette-reuse [THRESHOLD]]
+                      [--metrics FILE] [--metrics-prom FILE]
+                      [--progress] [--stall-timeout SEC]
+
+API (JSON):
+    POST /jobs         {"url": ..., "start": 10, "duration": 5,
+                        "output": "clip.gif", "priority": 0,
+                        "outputs": ["clip.webp", "clip.mp4"],
+                        "two_pass": false, "max_bytes": "2M",
+                        "fps": 15, "width": 480, ...render options}
+                       -> 202 {"id": 1, "status": "queued"}
+    GET  /jobs/ID      -> the job: status (queued, running, done, failed),
+                          output, error, timestamps and the live progress
+                          of its current step (fps, speed, percent, ETA)
+    GET  /jobs/ID/gif  -> the finished GIF
+    GET  /health       -> job counts and whether the daemon is draining
+
+Higher priorities run first. output is a path inside --output-dir (jobs
+without one are written as ID.gif); paths leading outside it are
+rejected. outputs lists further files rendered from the same decode as
+the GIF: .webp, .png (APNG) or .mp4 paths, or {"path": ..., "format":
+...} objects (see renditions.py), under the same rule. On SIGTERM or
+SIGINT the daemon stops accepting jobs, lets the running ones finish and
+exits; queued jobs stay in the queue file for the next start.
+
+Example:
+    curl --unix-socket /tmp/yt2gif.sock http://localhost/jobs \\
+         -d '{"url": "https://youtu.be/kX8hfK0PrHM", "start": 10, "duration": 5}'
+"""
+
+import os
+import sys
+import json
+import shutil
+import signal
+import tempfile
+import argparse
+import traceback
+import threading
+import socketserver
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import metrics
+import progress
+from batch import parse_bool
+from cache import parse_size
+from jobqueue import JobQueue, DONE
+from options import DEFAULTS, from_mapping
+from palettes import DEFAULT_THRESHOLD
+from renditions import parse_outputs
+from youtube2gif import (ConversionError, die, which, parse_time, convert,
+                         add_cache_arguments, open_caches)
+
+# seconds an idle worker waits before looking at the queue again
+POLL_INTERVAL = 1.0
+
+def parse_job(body):
+    """Validate a submitted job; returns its normalized spec."""
+    if not isinstance(body, dict) or not body.get("url"):
+        raise ValueError("a job needs a url")
+    options = dict(body.get("options") or {})
+    options.update({k: v for k, v in body.items() if k in DEFAULTS})
+    return {
+        "url": str(body["url"]).strip(),
+        "start": parse_time(body.get("start") or 0),
+        "duration": parse_time(body.get("duration") or 5),
+        "output": body.get("output"),
+        "outputs": parse_outputs(body.get("outputs")),
+        "two_pass": parse_bool(body.get("two_pass", False)),
+        "max_bytes": parse_size(body["max_bytes"]) if body.get("max_bytes") else None,
+        "priority": int(body.get("priority") or 0),
+        "options": from_mapping(options).as_dict(),
+    }
+
+class Daemon:
+    """Worker pool draining a JobQueue."""
+
+    def __init__(self, queue, output_dir, workers=None, threads=None,
+                 cache=None, results=None, full_download=False,
+                 palette_threshold=None):
+        cpus = os.cpu_count() or 1
+        self.queue = queue
+        self.output_dir = output_dir
+        self.workers = max(1, workers or cpus // 2)
+        self.threads = max(1, threads or cpus // self.workers)
+        self.cache = cache
+        self.results = results
+        self.full_download = full_download
+        self.palette_threshold = palette_threshold
+        self.yt = which("yt-dlp")
+        self.ffmpeg = which("ffmpeg")
+        self.draining = threading.Event()
+        self.progress = {}
+        self._wake = threading.Condition()
+        self._pool = []
+
+    def start(self):
+        requeued = self.queue.requeue_running()
+        if requeued:
+            print(f"Queue: {requeued} interrupted job(s) queued again")
+        for i in range(self.workers):
+            worker = threading.Thread(target=self.work,
+                                      name=f"yt2gif-worker-{i}")
+            worker.start()
+            self._pool.append(worker)
+
+    def submit(self, spec):
+        job_id = self.queue.submit(spec, spec["priority"])
+        with self._wake:
+            self._wake.notify()
+        return job_id
+
+    def track(self, snapshot):
+        """Keep the latest progress snapshot of each running job."""
+        if snapshot["job"] is not None:
+            self.progress[snapshot["job"]] = snapshot
+
+    def resolve(self, path):
+        """path under output_dir; ValueError if it would land outside it."""
+        root = os.path.realpath(self.output_dir)
+        full = os.path.realpath(os.path.join(root, path))
+        if os.path.commonpath([root, full]) != root or full == root:
+            raise ValueError(f"output outside the output directory: {path}")
+        return full
+
+    def output_path(self, job):
+        return self.resolve(job["spec"].get("output") or f"{job['id']}.gif")
+
+    def extra_outputs(self, job):
+        return [(self.resolve(path), fmt)
+                for path, fmt in job["spec"].get("outputs") or []]
+
+    def check_outputs(self, spec):
+        """Raise ValueError if a submitted job writes outside output_dir."""
+        if spec.get("output"):
+            self.resolve(spec["output"])
+        for path, _ in spec["outputs"]:
+            self.resolve(path)
+
+    def work(self):
+        scratch = tempfile.mkdtemp(prefix="yt2gif_worker_")
+        try:
+            while not self.draining.is_set():
+                job = self.queue.claim()
+                if job is None:
+                    with self._wake:
+                        self._wake.wait(POLL_INTERVAL)
+                    continue
+                self.run_job(job, scratch)
+        finally:
+            shutil.rmtree(scratch, ignore_errors=True)
+
+    def run_job(self, job, scratch):
+        spec = job["spec"]
+        try:
+            output = self.output_path(job)
+            print(f"Job {job['id']}: {spec['url']} -> {output}")
+            with metrics.job(job["id"]):
+                convert(spec["url"], spec["start"], spec["duration"], output,
+                        two_pass=spec["two_pass"], threads=self.threads,
+                        full_download=self.full_download, cache=self.cache,
+                        results=self.results,
+                        palette_threshold=self.palette_threshold,
+                        opts=from_mapping(spec["options"]),
+                        max_bytes=spec["max_bytes"],
+                        outputs=self.extra_outputs(job), yt=self.yt,
+                        ffmpeg=self.ffmpeg, tmpdir=scratch)
+        except (ConversionError, OSError, ValueError) as e:
+            print(f"Job {job['id']} failed: {e}", file=sys.stderr)
+            self.queue.fail(job["id"], e)
+        except Exception as e:
+            # a bug must not leave the job running or take the worker down
+            traceback.print_exc()
+            self.queue.fail(job["id"], f"{type(e).__name__}: {e}")
+        else:
+            print(f"Job {job['id']} done")
+            self.queue.finish(job["id"], output)
+        finally:
+            self.progress.pop(job["id"], None)
+
+    def drain(self):
+        """Stop taking jobs; the running ones finish."""
+        self.draining.set()
+        with self._wake:
+            self._wake.notify_all()
+
+    def wait(self):
+        for worker in self._pool:
+            worker.join()
+
+class Handler(BaseHTTPRequestHandler):
+    """JSON API of the daemon (see the module docstring)."""
+
+    def address_string(self):
+        # Unix socket clients have no address
+        return self.client_address[0] if self.client_address else "unix"
+
+    def send_json(self, code, body):
+        data = json.dumps(body).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        daemon = self.server.daemon
+        if self.path.rstrip("/") != "/jobs":
+            return self.send_json(404, {"error": "not found"})
+        if daemon.draining.is_set():
+            return self.send_json(503, {"error": "draining"})
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            spec = parse_job(json.loads(self.rfile.read(length) or b"{}"))
+            daemon.check_outputs(spec)
+        except (ValueError, TypeError) as e:
+            return self.send_json(400, {"error": str(e)})
+        job_id = daemon.submit(spec)
+        self.send_json(202, {"id": job_id, "status": "queued"})
+
+    def do_GET(self):
+        daemon = self.server.daemon
+        parts = self.path.strip("/").split("/")
+        if parts == ["health"]:
+            return self.send_json(200, {"draining": daemon.draining.is_set(),
+                                        "jobs": daemon.queue.counts()})
+        if len(parts) not in (2, 3) or parts[0] != "jobs" \
+                or not parts[1].isdigit() or parts[2:] not in ([], ["gif"]):
+            return self.send_json(404, {"error": "not found"})
+        job = daemon.queue.get(int(parts[1]))
+        if job is None:
+            return self.send_json(404, {"error": "unknown job"})
+        if parts[2:] != ["gif"]:
+            job["progress"] = daemon.progress.get(job["id"])
+            return self.send_json(200, job)
+        if job["status"] != DONE:
+            return self.send_json(409, {"error": f"job is {job['status']}"})
+        try:
+            f = open(job["output"], "rb")
+        except OSError as e:
+            return self.send_json(410, {"error": str(e)})
+        with f:
+            self.send_response(200)
+            self.send_header("Content-Type", "image/gif")
+            self.send_header("Content-Length", str(os.fstat(f.fileno()).st_size))
+            self.end_headers()
+            shutil.copyfileobj(f, self.wfile)
+
+class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+def make_server(args, daemon):
+    if args.socket:
+        if os.path.exists(args.socket):
+            os.remove(args.socket)
+        server = UnixHTTPServer(args.socket, Handler)
+        where = args.socket
+    else:
+        server = ThreadingHTTPServer((args.host, args.port), Handler)
+        where = f"http://{args.host}:{server.server_address[1]}"
+    server.daemon = daemon
+    return server, where
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="daemon.py",
+        description="Serve GIF conversion jobs from a persistent queue"
+    )
+    listen = parser.add_mutually_exclusive_group()
+    listen.add_argument("--socket", metavar="PATH",
+                        help="listen on this Unix socket")
+    listen.add_argument("--port", type=int, default=8765,
+                        help="listen on this TCP port (default: 8765)")
+    parser.add_argument("--host", default="127.0.0.1",
+                        help="TCP address to bind (default: 127.0.0.1)")
+    parser.add_argument("--queue", default="yt2gif-jobs.sqlite",
+                        help="SQLite queue file (default: yt2gif-jobs.sqlite)")
+    parser.add_argument("--workers", type=int,
+                        help="jobs converted at the same time (default: cores / 2)")
+    parser.add_argument("--threads", type=int,
+                        help="threads per ffmpeg encode (default: cores / workers)")
+    parser.add_argument("--output-dir", default=".",
+                        help="directory for relative and unnamed outputs")
+    parser.add_argument("--full-download", action="store_true",
+                        help="download whole videos instead of only the slice")
+    parser.add_argument("--palette-reuse", type=float, nargs="?",
+                        const=DEFAULT_THRESHOLD, metavar="THRESHOLD",
+                        help="with --cache-dir, reuse palettes of earlier clips whose "
+                             "colors differ by at most THRESHOLD (0-1, default "
+                             f"{DEFAULT_THRESHOLD})")
+    add_cache_arguments(parser)
+    metrics.add_arguments(parser)
+    progress.add_arguments(parser)
+    args = parser.parse_args()
+    metrics.install_from_args(args)
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    cache, results = open_caches(args)
+    queue = JobQueue(args.queue)
+    try:
+        daemon = Daemon(queue, args.output_dir, args.workers, args.threads,
+                        cache=cache, results=results,
+                        full_download=args.full_download,
+                        palette_threshold=args.palette_reuse)
+    except ConversionError as e:
+        die(e)
+    progress.install_from_args(args, callback=daemon.track)
+    server, where = make_server(args, daemon)
+
+    def stop(signum, frame):
+        print(f"Draining: {daemon.queue.counts()['running']} running job(s) "
+              "finish, queued jobs are kept")
+        daemon.drain()
+        # shutdown() waits for serve_forever(), which runs in this thread
+        threading.Thread(target=server.shutdown).start()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    daemon.start()
+    print(f"Listening on {where} with {daemon.workers} worker(s), "
+          f"{daemon.threads} ffmpeg thread(s) each")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        daemon.drain()
+        daemon.wait()
+        queue.close()
+        if args.socket and os.path.exists(args.socket):
+            os.remove(args.socket)
+    print("Stopped")
+
+if __name__ == "__main__":
+    main()
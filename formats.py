@@ -0,0 +1,80 @@
+"""
+formats.py
+
+Pick the cheapest yt-dlp format that is still good enough for the GIF.
+
+A GIF has no audio and is usually a few hundred pixels wide, so the best
+source is a video-only stream just wide enough for the target width:
+anything larger only costs download time and decode work.
+"""
+
+# protocols ffmpeg can read (and seek in) directly from the format URL
+SEEKABLE_PROTOCOLS = ("http", "https", "m3u8", "m3u8_native")
+
+class FormatPolicy:
+    """
+    Rank the formats reported by `yt-dlp -J` for a GIF of target_width px.
+
+    Preference order:
+      1. video-only streams over muxed video+audio ones
+      2. the narrowest stream that is at least target_width wide
+         (or the widest one if none is wide enough)
+      3. codecs in prefer_codecs order (cheapest to decode first)
+      4. the lowest bitrate
+    """
+
+    def __init__(self, target_width=320,
+                 prefer_codecs=("avc1", "vp9", "vp09", "av01"),
+                 video_only=True):
+        self.target_width = target_width
+        self.prefer_codecs = prefer_codecs
+        self.video_only = video_only
+
+    def is_video(self, fmt):
+        vcodec = fmt.get("vcodec")
+        return vcodec not in (None, "none") and fmt.get("ext") != "mhtml"
+
+    def has_audio(self, fmt):
+        return fmt.get("acodec") not in (None, "none")
+
+    def candidates(self, formats):
+        """Return the formats that carry a video stream."""
+        videos = [f for f in formats if self.is_video(f)]
+        if not videos:
+            # generic extractor (e.g. a plain MP4 URL) reports no codecs;
+            # audio and storyboard formats say so and stay excluded
+            videos = [f for f in formats if f.get("url")
+                      and f.get("vcodec") is None and f.get("ext") != "mhtml"]
+        if self.video_only:
+            silent = [f for f in videos if not self.has_audio(f)]
+            if silent:
+                return silent
+        return videos
+
+    def codec_rank(self, fmt):
+        vcodec = fmt.get("vcodec") or ""
+        for i, prefix in enumerate(self.prefer_codecs):
+            if vcodec.startswith(prefix):
+                return i
+        return len(self.prefer_codecs)
+
+    def sort_key(self, fmt):
+        width = fmt.get("width") or 0
+        big_enough = width >= self.target_width
+        # big enough: the narrower the better; too small: the wider the better
+        size_rank = width if big_enough else -width
+        return (not big_enough, size_rank, self.codec_rank(fmt),
+                fmt.get("tbr") or 0)
+
+    def select(self, formats):
+        """Return the best format dict, or None if there is no video."""
+        candidates = self.candidates(formats)
+        if not candidates:
+            return None
+        return min(candidates, key=self.sort_key)
+
+    @staticmethod
+    def is_seekable(fmt):
+        """True if ffmpeg can range-fetch fmt['url'] directly."""
+        return bool(fmt.get("url")) and \
+            fmt.get("protocol", "https") in SEEKABLE_PROTOCOLS
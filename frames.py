@@ -0,0 +1,206 @@
+"""
+frames.py
+
+Raw video frames from ffmpeg without a copy per frame.
+
+ffmpeg writes fixed-size rawvideo frames to a pipe. Instead of reading
+each one into a new bytes object, FrameSource reads them straight into a
+preallocated ring of slots (readinto on the unbuffered pipe), and hands
+out memoryviews of the slots; NumPy users can view a slot as an array
+with FrameRing.array(). A slot is overwritten once the ring wraps, so a
+consumer keeps at most slots - 1 earlier frames.
+
+With shared=True the ring lives in one multiprocessing.shared_memory
+block. map_frames() then lets worker processes consume the frames: only
+slot numbers travel through the queues, the workers attach to the block
+by name and read the pixels in place, with no pickling. The producer
+reuses a slot as soon as its worker hands it back.
+
+    source = FrameSource(cmd, width * height * 3)
+    for view in source:        # memoryview, valid for slots - 1 frames
+        ...
+    results = map_frames(FrameSource(cmd, size, shared=True), count_red,
+                         processes=4)
+"""
+
+import itertools
+import subprocess
+import multiprocessing
+from multiprocessing import shared_memory
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+import progress
+from messages import text
+from youtube2gif import ConversionError, wait_watched
+
+# default number of frame buffers in a ring
+SLOTS = 8
+
+class FrameRing:
+    """slots buffers of frame_size bytes, in process or shared memory."""
+
+    def __init__(self, frame_size, slots=SLOTS, shared=False, name=None):
+        self.frame_size = frame_size
+        self.slots = slots
+        self.shm = None
+        if shared or name:
+            self.shm = attach(name) if name else shared_memory.SharedMemory(
+                create=True, size=frame_size * slots)
+            buf = self.shm.buf
+        else:
+            buf = memoryview(bytearray(frame_size * slots))
+        self._buf = buf
+        self._views = [buf[i * frame_size:(i + 1) * frame_size]
+                       for i in range(slots)]
+
+    @property
+    def name(self):
+        """Name worker processes attach to (shared rings only)."""
+        return self.shm.name if self.shm else None
+
+    def slot(self, i):
+        return self._views[i]
+
+    def array(self, i, shape=None):
+        """NumPy uint8 view of slot i, optionally reshaped (no copy)."""
+        a = np.frombuffer(self._views[i], np.uint8)
+        return a.reshape(shape) if shape else a
+
+    def close(self, unlink=False):
+        """
+        Release the buffers; with unlink also free the shared block. Any
+        memoryview or array still referring to a slot must be gone.
+        """
+        for view in self._views:
+            view.release()
+        self._views = []
+        self._buf.release()
+        if self.shm is not None:
+            self.shm.close()
+            if unlink:
+                self.shm.unlink()
+
+def attach(name):
+    """Open an existing shared block without adopting its cleanup."""
+    try:
+        return shared_memory.SharedMemory(name, track=False)
+    except TypeError:
+        # before Python 3.13 an attach registers the block for unlinking;
+        # workers started by multiprocessing share the creator's resource
+        # tracker, so that only repeats its registration
+        return shared_memory.SharedMemory(name)
+
+def read_into(stream, view):
+    """Fill view from an unbuffered stream; False at the end of the stream."""
+    done, size = 0, len(view)
+    while done < size:
+        n = stream.readinto(view[done:])
+        if not n:
+            return False
+        done += n
+    return True
+
+class FrameSource:
+    """
+    Runs an ffmpeg command writing rawvideo frames of frame_size bytes to
+    stdout (see youtube2gif.raw_frames_command()) and reads them into a
+    FrameRing. Iterate for the frames in this process, or pass it to
+    map_frames().
+    """
+
+    def __init__(self, cmd, frame_size, slots=SLOTS, shared=False):
+        self.cmd = cmd
+        self.ring = FrameRing(frame_size, slots, shared=shared)
+
+    def read(self, next_slot):
+        """
+        Run ffmpeg, reading each frame into the slot next_slot() returns;
+        yields the slot numbers in frame order.
+        """
+        print("> " + " ".join(self.cmd))
+        proc, watcher = progress.popen(self.cmd, stdout=subprocess.PIPE,
+                                       bufsize=0)
+        try:
+            while True:
+                slot = next_slot()
+                if not read_into(proc.stdout, self.ring.slot(slot)):
+                    break
+                yield slot
+        except BaseException:
+            proc.kill()
+            raise
+        finally:
+            proc.stdout.close()
+            rc = wait_watched(watcher)
+        if rc != 0:
+            raise ConversionError(text("command_failed",
+                                       cmd=" ".join(self.cmd), rc=rc))
+
+    def __iter__(self):
+        """Yield a memoryview per frame, valid for the next slots - 1 frames."""
+        order = itertools.cycle(range(self.ring.slots))
+        for slot in self.read(lambda: next(order)):
+            yield self.ring.slot(slot)
+
+    def close(self):
+        self.ring.close(unlink=True)
+
+def _work(name, frame_size, slots, ready, free, results, fn):
+    ring = FrameRing(frame_size, slots, name=name)
+    try:
+        while True:
+            item = ready.get()
+            if item is None:
+                break
+            index, slot = item
+            try:
+                results.put((index, fn(index, ring.slot(slot))))
+            except Exception as e:
+                results.put((index, e))
+            finally:
+                free.put(slot)
+    finally:
+        ring.close()
+
+def map_frames(source, fn, processes=None):
+    """
+    Call fn(index, memoryview) for every frame of a shared FrameSource in
+    worker processes; returns the results in frame order. fn must be a
+    module-level function and must not keep the view past its return;
+    an exception it raises is raised here once all frames are done.
+    """
+    ring = source.ring
+    if ring.shm is None:
+        raise ValueError("map_frames() needs a FrameSource(shared=True)")
+    processes = processes or multiprocessing.cpu_count()
+    free, ready, results = (multiprocessing.Queue() for _ in range(3))
+    for slot in range(ring.slots):
+        free.put(slot)
+    workers = [multiprocessing.Process(
+        target=_work, args=(ring.name, ring.frame_size, ring.slots, ready,
+                            free, results, fn), daemon=True)
+        for _ in range(processes)]
+    for worker in workers:
+        worker.start()
+
+    count = 0
+    try:
+        # a slot is only reused once a worker has put it back on free
+        for slot in source.read(free.get):
+            ready.put((count, slot))
+            count += 1
+    finally:
+        for _ in workers:
+            ready.put(None)
+        collected = dict(results.get() for _ in range(count))
+        for worker in workers:
+            worker.join()
+        source.close()
+    for result in collected.values():
+        if isinstance(result, Exception):
+            raise result
+    return [collected[i] for i in range(count)]
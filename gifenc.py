@@ -0,0 +1,482 @@
+"""
+gifenc.py
+
+In-process GIF encoder: color quantization, LZW compression and the
+GIF89a container, for frames decoded by ffmpeg into raw rgb24.
+
+Unlike ffmpeg's paletteuse, every stage is under our control: the palette
+(one global palette, or one per frame), the LZW stream and each frame's
+disposal, delay and placement. The palette comes from a median cut of a
+sample of the clip's pixels, refined by a few k-means rounds, and pixels
+are mapped to it through a lookup table over the RGB555 cube. NumPy is
+optional: with it quantization and mapping are vectorized, without it the
+pure-Python fallback skips the k-means refinement and maps colors through
+a memo of the ones seen so far. No dithering is applied.
+
+With one global palette, frames are optimized as they are written (see
+Encoder): a frame identical to the previous one only lengthens its
+delay, and the others are cropped to the box of pixels that changed,
+with the unchanged pixels inside it transparent. Static backgrounds are
+then stored once instead of in every frame. Given a palette made in
+advance from sampled frames (palette_for()), Encoder takes the frames
+one at a time and holds only the previous one, so clips of any length
+fit in memory.
+
+concat() joins the frames of several GIFs into one file without
+re-encoding them, e.g. the segments of a parallel encode.
+
+    frames = [rgb24 bytes of width * height pixels, ...]
+    with open("out.gif", "wb") as f:
+        gifenc.encode(frames, width, height, fps=10, out=f)
+
+    encoder = gifenc.Encoder(f, width, height, 10, palette_for(samples))
+    for frame in decoded_frames:
+        encoder.add(frame)
+    encoder.close()
+"""
+
+import struct
+import itertools
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# pixels sampled from the whole clip to build the palette
+SAMPLE_PIXELS = 50000
+
+# k-means rounds refining the median cut palette (NumPy only)
+KMEANS_ITERATIONS = 4
+
+# bits per channel of the color lookup table
+LUT_BITS = 5
+
+# largest LZW code of a GIF
+MAX_CODE = 4095
+
+def sample_pixels(frames, count=SAMPLE_PIXELS):
+    """About count pixels spread evenly over all frames, as rgb24 bytes."""
+    total = sum(len(f) for f in frames) // 3
+    step = max(1, total // count)
+    return b"".join(
+        b"".join(f[i:i + 3] for i in range(0, len(f) - 2, 3 * step))
+        for f in frames)
+
+def median_cut(rgb, colors):
+    """Palette of at most colors entries for rgb24 bytes, as rgb24 bytes."""
+    if np is not None:
+        return _median_cut_np(np.frombuffer(rgb, np.uint8).reshape(-1, 3), colors)
+    def ranges(box):
+        return [max(p[c] for p in box) - min(p[c] for p in box) for c in range(3)]
+
+    pixels = [tuple(rgb[i:i + 3]) for i in range(0, len(rgb) - 2, 3)]
+    boxes = [(pixels, ranges(pixels))]
+    while len(boxes) < colors:
+        best = max(range(len(boxes)),
+                   key=lambda i: max(boxes[i][1]) * len(boxes[i][0]))
+        box, span = boxes[best]
+        if max(span) == 0:
+            break
+        del boxes[best]
+        channel = span.index(max(span))
+        box.sort(key=lambda p: p[channel])
+        halves = box[:len(box) // 2], box[len(box) // 2:]
+        boxes += [(half, ranges(half)) for half in halves]
+    return bytes(round(sum(p[c] for p in box) / len(box))
+                 for box, _ in boxes for c in range(3))
+
+def _median_cut_np(pixels, colors):
+    def span(box):
+        return box.max(0).astype(int) - box.min(0) if len(box) > 1 else np.zeros(3, int)
+
+    boxes = [(pixels, span(pixels))]
+    while len(boxes) < colors:
+        scores = [s.max() * len(b) for b, s in boxes]
+        best = int(np.argmax(scores))
+        if scores[best] == 0:
+            break
+        box, s = boxes.pop(best)
+        box = box[np.argsort(box[:, int(np.argmax(s))], kind="stable")]
+        halves = box[:len(box) // 2], box[len(box) // 2:]
+        boxes += [(half, span(half)) for half in halves]
+    palette = np.array([b.mean(0) for b, _ in boxes])
+    return kmeans(pixels, palette).astype(np.uint8).tobytes()
+
+def nearest(pixels, palette, chunk=16384):
+    """Index of the closest palette color of each pixel (NumPy arrays)."""
+    # |p - c|^2 = |p|^2 - 2 p.c + |c|^2, and |p|^2 is the same for all c
+    palette = palette.astype(np.float32)
+    weights = (palette ** 2).sum(1)
+    out = np.empty(len(pixels), np.intp)
+    for i in range(0, len(pixels), chunk):
+        block = pixels[i:i + chunk].astype(np.float32)
+        out[i:i + chunk] = (weights - 2 * block @ palette.T).argmin(1)
+    return out
+
+def kmeans(pixels, palette, iterations=KMEANS_ITERATIONS):
+    """Refine palette (float array) towards the centroids of its pixels."""
+    for _ in range(iterations):
+        labels = nearest(pixels, np.rint(palette))
+        counts = np.bincount(labels, minlength=len(palette))
+        sums = np.stack([np.bincount(labels, pixels[:, c], len(palette))
+                         for c in range(3)], 1)
+        used = counts > 0
+        palette[used] = sums[used] / counts[used, None]
+    return np.clip(np.rint(palette), 0, 255)
+
+class ColorMapper:
+    """Maps rgb24 frames to indices of one palette."""
+
+    def __init__(self, palette):
+        self.palette = palette
+        self.shift = 8 - LUT_BITS
+        if np is not None:
+            levels = np.arange(1 << LUT_BITS) << self.shift
+            # center of each cell of the RGB cube
+            levels += (1 << self.shift) // 2
+            r, g, b = np.meshgrid(levels, levels, levels, indexing="ij")
+            cube = np.stack([r.ravel(), g.ravel(), b.ravel()], 1)
+            pal = np.frombuffer(palette, np.uint8).reshape(-1, 3)
+            self.lut = nearest(cube, pal).astype(np.uint8)
+        else:
+            self.colors = [tuple(palette[i:i + 3])
+                           for i in range(0, len(palette), 3)]
+            self.memo = {}
+
+    def key(self, r, g, b):
+        s = self.shift
+        return ((r >> s) << (2 * LUT_BITS)) | ((g >> s) << LUT_BITS) | (b >> s)
+
+    def map(self, rgb):
+        """Palette indices of an rgb24 frame, one byte per pixel."""
+        if np is not None:
+            px = np.frombuffer(rgb, np.uint8).reshape(-1, 3) >> self.shift
+            keys = (px[:, 0].astype(np.intp) << (2 * LUT_BITS)) | \
+                   (px[:, 1].astype(np.intp) << LUT_BITS) | px[:, 2]
+            return self.lut[keys].tobytes()
+        memo = self.memo
+        out = bytearray(len(rgb) // 3)
+        for n, i in enumerate(range(0, len(rgb) - 2, 3)):
+            k = self.key(rgb[i], rgb[i + 1], rgb[i + 2])
+            index = memo.get(k)
+            if index is None:
+                index = memo[k] = self.closest(rgb[i:i + 3])
+            out[n] = index
+        return bytes(out)
+
+    def closest(self, color):
+        r, g, b = color
+        return min(range(len(self.colors)), key=lambda i:
+                   (self.colors[i][0] - r) ** 2 + (self.colors[i][1] - g) ** 2 +
+                   (self.colors[i][2] - b) ** 2)
+
+def lzw_compress(indices, min_code_size):
+    """GIF LZW data of indices (bytes), without the block framing."""
+    clear = 1 << min_code_size
+    code_size = min_code_size + 1
+    next_code = clear + 2
+    table = {}
+    out = bytearray()
+    acc, bits = clear, code_size
+    if not indices:
+        acc |= (clear + 1) << bits
+        bits += code_size
+        return bytes(out) + acc.to_bytes((bits + 7) // 8, "little")
+    prefix = indices[0]
+    for k in indices[1:]:
+        key = (prefix << 8) | k
+        code = table.get(key)
+        if code is not None:
+            prefix = code
+            continue
+        acc |= prefix << bits
+        bits += code_size
+        if next_code <= MAX_CODE:
+            table[key] = next_code
+            next_code += 1
+            if next_code > (1 << code_size) and code_size < 12:
+                code_size += 1
+        else:
+            # table full: start over
+            acc |= clear << bits
+            bits += code_size
+            table.clear()
+            code_size = min_code_size + 1
+            next_code = clear + 2
+        while bits >= 8:
+            out.append(acc & 0xFF)
+            acc >>= 8
+            bits -= 8
+        prefix = k
+    acc |= prefix << bits
+    bits += code_size
+    if next_code <= MAX_CODE and next_code + 1 > (1 << code_size) and code_size < 12:
+        # the decoder widens its codes after the entry the last code adds
+        code_size += 1
+    acc |= (clear + 1) << bits
+    bits += code_size
+    while bits > 0:
+        out.append(acc & 0xFF)
+        acc >>= 8
+        bits -= 8
+    return bytes(out)
+
+def sub_blocks(data):
+    """Split data into GIF sub-blocks, with the terminating empty block."""
+    return b"".join(bytes([len(data[i:i + 255])]) + data[i:i + 255]
+                    for i in range(0, len(data), 255)) + b"\x00"
+
+def table_bits(colors):
+    """Bits per index of a color table holding colors entries (1-8)."""
+    return max(1, (colors - 1).bit_length())
+
+def color_table(palette):
+    """palette padded to a power-of-two table; returns (bytes, bits)."""
+    bits = table_bits(len(palette) // 3)
+    return palette.ljust(3 << bits, b"\x00"), bits
+
+class GifWriter:
+    """Writes a GIF89a animation frame by frame to a binary writable."""
+
+    def __init__(self, out, width, height, palette=None, loop=0):
+        self.out = out
+        self.width = width
+        self.height = height
+        self.bits = 8
+        flags, table = 0, b""
+        if palette is not None:
+            table, self.bits = color_table(palette)
+            # global table, 8-bit color resolution, table size
+            flags = 0x80 | 0x70 | (self.bits - 1)
+        out.write(b"GIF89a" + struct.pack("<HHBBB", width, height, flags, 0, 0)
+                  + table)
+        if loop is not None:
+            out.write(b"\x21\xff\x0bNETSCAPE2.0\x03\x01" +
+                      struct.pack("<H", loop) + b"\x00")
+
+    def add_frame(self, indices, delay, palette=None, left=0, top=0,
+                  width=None, height=None, transparent=None, disposal=1):
+        """
+        Append a frame of palette indices (one byte per pixel) shown for
+        delay centiseconds. palette is a local color table; the rectangle
+        defaults to the whole canvas.
+        """
+        width = width or self.width
+        height = height or self.height
+        packed = (disposal << 2) | (transparent is not None)
+        self.out.write(b"\x21\xf9\x04" +
+                       struct.pack("<BHB", packed, delay, transparent or 0) +
+                       b"\x00")
+        flags, table, bits = 0, b"", self.bits
+        if palette is not None:
+            table, bits = color_table(palette)
+            flags = 0x80 | (bits - 1)
+        self.out.write(b"\x2c" + struct.pack("<HHHHB", left, top, width,
+                                              height, flags) + table)
+        min_code_size = max(2, bits)
+        self.out.write(bytes([min_code_size]) +
+                       sub_blocks(lzw_compress(indices, min_code_size)))
+
+    def close(self):
+        self.out.write(b"\x3b")
+
+def delays(fps):
+    """Endless frame delays in centiseconds whose running total tracks fps."""
+    for i in itertools.count():
+        yield round((i + 1) * 100 / fps) - round(i * 100 / fps)
+
+def changed_box(prev, frame, width, height):
+    """(left, top, width, height) of the pixels that differ, or None."""
+    if np is not None:
+        diff = (np.frombuffer(prev, np.uint8) !=
+                np.frombuffer(frame, np.uint8)).reshape(height, width)
+        rows = np.flatnonzero(diff.any(1))
+        if not len(rows):
+            return None
+        cols = np.flatnonzero(diff.any(0))
+        return (int(cols[0]), int(rows[0]), int(cols[-1] - cols[0] + 1),
+                int(rows[-1] - rows[0] + 1))
+    rows = [y for y in range(height)
+            if prev[y * width:(y + 1) * width] != frame[y * width:(y + 1) * width]]
+    if not rows:
+        return None
+    left, right = width, 0
+    for y in rows:
+        a = prev[y * width:(y + 1) * width]
+        b = frame[y * width:(y + 1) * width]
+        changed = [x for x in range(width) if a[x] != b[x]]
+        left, right = min(left, changed[0]), max(right, changed[-1] + 1)
+    return left, rows[0], right - left, rows[-1] - rows[0] + 1
+
+def crop_delta(prev, frame, width, box, transparent):
+    """
+    The box of frame, with the pixels that are the same in prev (which
+    stays on screen below it) replaced by the transparent index.
+    """
+    left, top, w, h = box
+    if np is not None:
+        a = np.frombuffer(prev, np.uint8).reshape(-1, width)[top:top + h, left:left + w]
+        b = np.frombuffer(frame, np.uint8).reshape(-1, width)[top:top + h, left:left + w]
+        return np.where(a == b, np.uint8(transparent), b).tobytes()
+    out = bytearray()
+    for y in range(top, top + h):
+        row = y * width + left
+        out += bytes(transparent if p == q else q
+                     for p, q in zip(prev[row:row + w], frame[row:row + w]))
+    return bytes(out)
+
+def palette_for(frames, max_colors=256, optimize_frames=True):
+    """
+    Global palette of max_colors for rgb24 frames (all of a clip, or a
+    sample of them); with optimize_frames one entry is left for Encoder's
+    transparency.
+    """
+    colors = max_colors - 1 if optimize_frames else max_colors
+    return median_cut(sample_pixels(frames), colors)
+
+class Encoder:
+    """
+    Writes rgb24 frames one at a time as a GIF with one global palette
+    (see palette_for()). With optimize_frames only the changes on screen
+    are stored: a frame identical to the one before only lengthens its
+    delay, and every other frame after the first is cropped to the box of
+    its changed pixels, with the unchanged ones in it transparent. A frame
+    is written once the next one shows how long it stays.
+    """
+
+    def __init__(self, out, width, height, fps, palette, loop=0,
+                 optimize_frames=True):
+        self.width = width
+        self.height = height
+        self.mapper = ColorMapper(palette)
+        self.delays = delays(fps)
+        self.transparent = None
+        if optimize_frames:
+            # the entry after the colors, which no pixel maps to
+            self.transparent = len(palette) // 3
+            palette += b"\x00\x00\x00"
+        self.writer = GifWriter(out, width, height, palette, loop=loop)
+        self.prev = self.pending = None
+
+    def add(self, frame):
+        indices = self.mapper.map(frame)
+        delay = next(self.delays)
+        if self.transparent is None:
+            self.writer.add_frame(indices, delay)
+            return
+        if self.prev is None:
+            self.pending = [indices, delay, (0, 0, self.width, self.height)]
+        else:
+            box = changed_box(self.prev, indices, self.width, self.height)
+            if box is None:
+                self.pending[1] += delay
+                return
+            self.flush()
+            self.pending = [crop_delta(self.prev, indices, self.width, box,
+                                       self.transparent), delay, box]
+        self.prev = indices
+
+    def flush(self):
+        indices, delay, (left, top, w, h) = self.pending
+        self.writer.add_frame(indices, delay, left=left, top=top, width=w,
+                              height=h, transparent=self.transparent)
+
+    def close(self):
+        if self.pending is not None:
+            self.flush()
+        self.writer.close()
+
+def encode(frames, width, height, fps, out, max_colors=256, per_frame=False,
+           loop=0, optimize_frames=True, palette=None):
+    """
+    Encode rgb24 frames as a GIF into the binary writable out, with one
+    palette of max_colors for the whole clip, or a local one per frame
+    with per_frame. With the global palette, optimize_frames stores only
+    the changes between frames (see Encoder). frames must be a list
+    unless the global palette is given (see palette_for()); it is then
+    read once, frame by frame.
+    """
+    if per_frame:
+        writer = GifWriter(out, width, height, loop=loop)
+        for frame, delay in zip(frames, delays(fps)):
+            palette = median_cut(sample_pixels([frame]), max_colors)
+            writer.add_frame(ColorMapper(palette).map(frame), delay,
+                             palette=palette)
+        writer.close()
+        return
+
+    if palette is None:
+        palette = palette_for(frames, max_colors, optimize_frames)
+    encoder = Encoder(out, width, height, fps, palette, loop=loop,
+                      optimize_frames=optimize_frames)
+    for frame in frames:
+        encoder.add(frame)
+    encoder.close()
+
+def skip_sub_blocks(data, pos):
+    """Position after the sub-blocks starting at pos."""
+    while data[pos]:
+        pos += data[pos] + 1
+    return pos + 1
+
+def blocks(data):
+    """
+    Split a GIF into (logical screen descriptor, global color table,
+    [(kind, block bytes)]), kind being the extension label (0xF9, 0xFF,
+    ...) or 0x2C for an image with its data.
+    """
+    if data[:3] != b"GIF":
+        raise ValueError("not a GIF")
+    screen = data[6:13]
+    pos = 13
+    table = b""
+    if screen[4] & 0x80:
+        table = data[pos:pos + (3 << ((screen[4] & 7) + 1))]
+        pos += len(table)
+    found = []
+    while pos < len(data) and data[pos] != 0x3B:
+        begin = pos
+        if data[pos] == 0x21:
+            kind = data[pos + 1]
+            pos = skip_sub_blocks(data, pos + 2)
+        elif data[pos] == 0x2C:
+            kind = 0x2C
+            flags = data[pos + 9]
+            pos += 10
+            if flags & 0x80:
+                pos += 3 << ((flags & 7) + 1)
+            pos = skip_sub_blocks(data, pos + 1)
+        else:
+            raise ValueError(f"bad GIF block 0x{data[pos]:02x} at {pos}")
+        found.append((kind, data[begin:pos]))
+    return screen, table, found
+
+def with_local_table(image, table):
+    """An image block using table as its local color table."""
+    flags = image[9]
+    if flags & 0x80:
+        return image
+    bits = (len(table) // 3).bit_length() - 1   # len(table) == 3 << bits
+    # keep the interlace flag, drop sort, add the table
+    flags = (flags & 0x40) | 0x80 | (bits - 1)
+    return image[:9] + bytes([flags]) + table + image[10:]
+
+def concat(gifs, out):
+    """
+    Join GIFs (bytes) with the same canvas into one animation, written
+    to the binary writable out: the header, global palette and loop
+    setting of the first, then the frames of all in order. Frames of a
+    later GIF whose global palette differs get it as a local palette.
+    """
+    screen, table, first = blocks(gifs[0])
+    out.write(b"GIF89a" + screen + table)
+    for i, gif in enumerate(gifs):
+        _, own, found = (screen, table, first) if i == 0 else blocks(gif)
+        for kind, block in found:
+            if kind == 0xFF and i > 0:
+                continue  # loop setting: the first GIF's applies
+            if kind == 0x2C and own != table:
+                block = with_local_table(block, own)
+            out.write(block)
+    out.write(b"\x3b")
@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+"""
+highlights.py
+
+Pick the most eventful moments of a video and render them as GIFs,
+instead of choosing start and duration by hand.
+
+One fast decode of the whole source at a tiny size (grayscale, a few
+frames per second) scores every sample by motion (mean pixel change from
+the previous sample) and scene change (histogram distance to it). Windows
+of --duration seconds are ranked by their mean motion plus the strongest
+cut inside them, and the best --count windows that do not overlap are
+rendered. All of them come from a single decode of the span they cover:
+one ffmpeg filter graph splits the decoded frames into one
+trim/palettegen/paletteuse branch per GIF, and the branches are encoded
+in parallel.
+
+Usage:
+    python3 highlights.py URL [--count N] [--duration SEC] [--prefix NAME]
+                          [--min-gap SEC] [--analysis-fps N] [--threads N]
+                          [--fps N] [--width PX] [...render options]
+                          [--cache-dir [DIR]]
+                          [--metrics FILE] [--metrics-prom FILE]
+                          [--progress] [--stall-timeout SEC]
+
+The GIFs are written as PREFIX_1.gif (best) to PREFIX_N.gif.
+
+Example:
+    python3 highlights.py https://youtu.be/kX8hfK0PrHM --count 3 --duration 4
+"""
+
+import sys
+import shutil
+import tempfile
+import argparse
+
+import metrics
+import progress
+from formats import FormatPolicy
+from frames import FrameSource
+from options import RenderOptions, add_arguments as add_render_arguments, from_args
+from youtube2gif import (ConversionError, die, which, run,
+                         fmt_time, thread_args, input_args, plan_seek,
+                         open_source, add_cache_arguments, open_caches)
+
+# size of the grayscale frames of the analysis pass
+ANALYSIS_WIDTH = 64
+ANALYSIS_HEIGHT = 36
+ANALYSIS_FPS = 4
+
+# levels of the luma histogram compared for scene changes
+HIST_LEVELS = 16
+
+# weight of the strongest scene change of a window against its mean motion
+CUT_WEIGHT = 0.5
+
+def analysis_command(ffmpeg, mp4, fps=ANALYSIS_FPS, threads=None):
+    """ffmpeg command decoding mp4 into tiny raw grayscale frames."""
+    return [ffmpeg,
+            "-v", "warning",
+            *thread_args(threads, False),
+            "-i", mp4,
+            "-an",
+            "-vf", f"fps={fps},scale={ANALYSIS_WIDTH}:{ANALYSIS_HEIGHT},format=gray",
+            "-f", "rawvideo", "-pix_fmt", "gray",
+            "pipe:1"]
+
+def luma_histogram(frame):
+    shift = 8 - (HIST_LEVELS - 1).bit_length()
+    bins = [0] * HIST_LEVELS
+    for value in frame:
+        bins[value >> shift] += 1
+    return [count / len(frame) for count in bins]
+
+def compare(prev, frame, prev_hist, hist):
+    """(motion, cut) of a frame against the previous one, both 0..1."""
+    motion = sum(abs(a - b) for a, b in zip(prev, frame)) / (255 * len(frame))
+    cut = sum(abs(a - b) for a, b in zip(prev_hist, hist)) / 2
+    return motion, cut
+
+def analyze(ffmpeg, mp4, fps=ANALYSIS_FPS, threads=None):
+    """
+    Decode mp4 once at analysis size; returns [(time, motion, cut)], one
+    sample per 1/fps seconds (the first sample has no predecessor: 0, 0).
+    """
+    # two slots: the previous frame stays intact while the next is read
+    source = FrameSource(analysis_command(ffmpeg, mp4, fps, threads),
+                         ANALYSIS_WIDTH * ANALYSIS_HEIGHT, slots=2)
+    samples = []
+    try:
+        with metrics.stage("analyze"):
+            prev = prev_hist = None
+            for frame in source:
+                hist = luma_histogram(frame)
+                motion, cut = (compare(prev, frame, prev_hist, hist)
+                               if prev is not None else (0.0, 0.0))
+                samples.append((len(samples) / fps, motion, cut))
+                prev, prev_hist = frame, hist
+    finally:
+        source.close()
+    return samples
+
+def score_windows(samples, duration, fps=ANALYSIS_FPS):
+    """Return [(score, start)] of every window of duration seconds."""
+    size = max(1, round(duration * fps))
+    windows = []
+    for i in range(len(samples) - size + 1):
+        window = samples[i:i + size]
+        motion = sum(s[1] for s in window) / size
+        # a cut into the window's first frame is not part of the window
+        cut = max((s[2] for s in window[1:]), default=0.0)
+        windows.append((motion + CUT_WEIGHT * cut, window[0][0]))
+    return windows
+
+def pick_segments(windows, count, duration, min_gap=0.0):
+    """The count best windows at least min_gap apart, sorted by score."""
+    picked = []
+    for score, start in sorted(windows, key=lambda w: (-w[0], w[1])):
+        if all(abs(start - other) >= duration + min_gap for _, other in picked):
+            picked.append((score, start))
+            if len(picked) == count:
+                break
+    return picked
+
+def render_command(ffmpeg, mp4, starts, duration, outputs, threads=None,
+                   seek=None, opts=None):
+    """
+    ffmpeg command rendering every [start, start+duration] slice of mp4 to
+    its output from one decode of the span covering them all. seek is a
+    keyframe seek plan for the span's start (see youtube2gif.input_args()).
+    """
+    opts = opts or RenderOptions()
+    vf, gen, use = opts.video_filter(), opts.palettegen(), opts.paletteuse()
+    first = min(starts)
+    src, trim = input_args(mp4, first, max(starts) + duration - first, seek)
+    n = len(starts)
+    graph = [f"[0:v]{trim}split={n}" + "".join(f"[s{i}]" for i in range(n))]
+    mapping = []
+    for i, (start, out) in enumerate(zip(starts, outputs)):
+        offset = start - first
+        graph.append(f"[s{i}]trim=start={offset:.6f}:end={offset + duration:.6f},"
+                     f"setpts=PTS-STARTPTS,{vf},split[a{i}][b{i}];"
+                     f"[a{i}]{gen}[p{i}];[b{i}][p{i}]{use}[g{i}]")
+        mapping += ["-map", f"[g{i}]", "-y", out]
+    return [ffmpeg,
+            "-v", "warning",
+            *thread_args(threads, True),
+            *src,
+            "-filter_complex", ";".join(graph),
+            *mapping]
+
+def render_segments(ffmpeg, mp4, starts, duration, outputs, threads=None,
+                    keyframe_seek=True, opts=None):
+    """Render the slices starting at starts to outputs in one ffmpeg run."""
+    seek = plan_seek(mp4, min(starts)) if keyframe_seek else None
+    with metrics.stage("render") as m:
+        run(render_command(ffmpeg, mp4, starts, duration, outputs,
+                           threads=threads, seek=seek, opts=opts))
+        m["bytes_out"] = sum(metrics.file_size(out) or 0 for out in outputs)
+
+def make_highlights(url, count=3, duration=3.0, prefix="highlight",
+                    min_gap=0.0, analysis_fps=ANALYSIS_FPS, threads=None,
+                    cache=None, keyframe_seek=True, opts=None,
+                    yt=None, ffmpeg=None):
+    """
+    Render the count most eventful duration-second moments of url as
+    PREFIX_1.gif (best) ... PREFIX_N.gif; returns [(path, start, score)].
+    The whole video is downloaded (or taken from cache, a SourceCache),
+    analyzed once at low resolution and all GIFs rendered from one decode.
+    Raises ConversionError if a tool is missing or a step fails.
+    """
+    opts = opts or RenderOptions()
+    yt     = yt or which("yt-dlp")
+    ffmpeg = ffmpeg or which("ffmpeg")
+    tmpdir = tempfile.mkdtemp(prefix="yt2gif_")
+    try:
+        with open_source(yt, ffmpeg, url, 0.0, None, tmpdir,
+                         full_download=True,
+                         policy=FormatPolicy(target_width=opts.width),
+                         cache=cache) as (mp4, _):
+            samples = analyze(ffmpeg, mp4, analysis_fps, threads)
+            picked = pick_segments(score_windows(samples, duration, analysis_fps),
+                                   count, duration, min_gap)
+            if not picked:
+                raise ConversionError(f"video is shorter than {duration:g}s")
+            outputs = [f"{prefix}_{rank}.gif" for rank in range(1, len(picked) + 1)]
+            starts = [start for _, start in picked]
+            render_segments(ffmpeg, mp4, starts, duration, outputs,
+                            threads=threads, keyframe_seek=keyframe_seek,
+                            opts=opts)
+    finally:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+    return [(out, start, score) for out, (score, start) in zip(outputs, picked)]
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="highlights.py",
+        description="Render the most eventful moments of a video as GIFs"
+    )
+    parser.add_argument("url")
+    parser.add_argument("--count", type=int, default=3,
+                        help="number of GIFs (default: 3)")
+    parser.add_argument("--duration", type=float, default=3.0,
+                        help="seconds per GIF (default: 3)")
+    parser.add_argument("--prefix", default="highlight",
+                        help="output name prefix (default: highlight)")
+    parser.add_argument("--min-gap", type=float, default=0.0, metavar="SEC",
+                        help="minimum seconds between two highlights (default: 0)")
+    parser.add_argument("--analysis-fps", type=float, default=ANALYSIS_FPS,
+                        help=f"frames per second scored (default: {ANALYSIS_FPS})")
+    parser.add_argument("--threads", type=int,
+                        help="maximum threads per ffmpeg process (default: ffmpeg's choice)")
+    parser.add_argument("--no-keyframe-seek", action="store_true",
+                        help="let ffmpeg seek on its own instead of using a keyframe index")
+    add_render_arguments(parser)
+    add_cache_arguments(parser)
+    metrics.add_arguments(parser)
+    progress.add_arguments(parser)
+    args = parser.parse_args()
+    if args.count < 1 or args.duration <= 0 or args.analysis_fps <= 0:
+        parser.error("--count, --duration and --analysis-fps must be positive")
+    metrics.install_from_args(args)
+    progress.install_from_args(args)
+
+    try:
+        cache, _ = open_caches(args)
+        with metrics.job(args.prefix):
+            picked = make_highlights(args.url, args.count, args.duration,
+                                     args.prefix, min_gap=args.min_gap,
+                                     analysis_fps=args.analysis_fps,
+                                     threads=args.threads, cache=cache,
+                                     keyframe_seek=not args.no_keyframe_seek,
+                                     opts=from_args(args))
+    except ConversionError as e:
+        die(e)
+
+    print()
+    for out, start, score in picked:
+        print(f"✔ {out}: {fmt_time(start)}s +{args.duration:g}s (score {score:.3f})")
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,119 @@
+"""
+jobqueue.py
+
+Persistent priority queue of conversion jobs, stored in SQLite.
+
+Jobs survive a restart of the daemon: queued jobs stay queued, and jobs
+that were running when the process died are queued again on the next
+start. Higher priorities are claimed first, equal priorities in order of
+submission. Claims are atomic, so any number of worker threads can take
+jobs from one queue.
+"""
+
+import json
+import time
+import sqlite3
+import threading
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id       INTEGER PRIMARY KEY AUTOINCREMENT,
+    status   TEXT NOT NULL,
+    priority INTEGER NOT NULL DEFAULT 0,
+    spec     TEXT NOT NULL,
+    output   TEXT,
+    error    TEXT,
+    created  REAL NOT NULL,
+    started  REAL,
+    finished REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_pending ON jobs (status, priority DESC, id);
+"""
+
+COLUMNS = ("id", "status", "priority", "spec", "output", "error",
+           "created", "started", "finished")
+
+class JobQueue:
+    """Jobs of the daemon: submit, claim, finish and look up."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=30, isolation_level=None,
+                                   check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(SCHEMA)
+
+    def _transaction(self, fn):
+        """Run fn(db) in an immediate (write-locked) transaction."""
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                result = fn(self._db)
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self._db.execute("COMMIT")
+            return result
+
+    def submit(self, spec, priority=0):
+        """Queue a job (a JSON-serializable dict); returns its id."""
+        return self._transaction(lambda db: db.execute(
+            "INSERT INTO jobs (status, priority, spec, created) "
+            "VALUES (?, ?, ?, ?)",
+            (QUEUED, priority, json.dumps(spec), time.time())).lastrowid)
+
+    def claim(self):
+        """Mark the next queued job running and return it, or None."""
+        def take(db):
+            row = db.execute(
+                f"SELECT {', '.join(COLUMNS)} FROM jobs WHERE status = ? "
+                "ORDER BY priority DESC, id LIMIT 1", (QUEUED,)).fetchone()
+            if row is None:
+                return None
+            db.execute("UPDATE jobs SET status = ?, started = ? WHERE id = ?",
+                       (RUNNING, time.time(), row[0]))
+            return row[0]
+        job_id = self._transaction(take)
+        return None if job_id is None else self.get(job_id)
+
+    def finish(self, job_id, output):
+        self._transaction(lambda db: db.execute(
+            "UPDATE jobs SET status = ?, output = ?, finished = ? WHERE id = ?",
+            (DONE, output, time.time(), job_id)))
+
+    def fail(self, job_id, error):
+        self._transaction(lambda db: db.execute(
+            "UPDATE jobs SET status = ?, error = ?, finished = ? WHERE id = ?",
+            (FAILED, str(error), time.time(), job_id)))
+
+    def requeue_running(self):
+        """Queue again the jobs a dead process left running; returns their count."""
+        return self._transaction(lambda db: db.execute(
+            "UPDATE jobs SET status = ?, started = NULL WHERE status = ?",
+            (QUEUED, RUNNING)).rowcount)
+
+    def get(self, job_id):
+        """Return a job as a dict (spec decoded), or None if unknown."""
+        with self._lock:
+            row = self._db.execute(
+                f"SELECT {', '.join(COLUMNS)} FROM jobs WHERE id = ?",
+                (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(zip(COLUMNS, row))
+        job["spec"] = json.loads(job["spec"])
+        return job
+
+    def counts(self):
+        """Return {status: number of jobs}."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return {status: 0 for status in (QUEUED, RUNNING, DONE, FAILED)} | dict(rows)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
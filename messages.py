@@ -0,0 +1,59 @@
+"""
+messages.py
+
+Translated user-facing messages.
+
+Each language is a JSON catalog in languages/ mapping message keys to
+str.format() templates. Only the catalog of the selected language (and
+English, for keys a catalog lacks) is ever read, on first use.
+"""
+
+import os
+import json
+import threading
+
+CATALOG_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                           "languages")
+
+# supported languages (must match the catalogs in languages/)
+LANGUAGES = (
+    "english",
+    "italian",
+    "french",
+    "german",
+    "spanish",
+    "portuguese",
+    "russian",
+    "chinese",
+    "japanese",
+)
+
+DEFAULT_LANGUAGE = "english"
+
+_catalogs = {}
+_catalogs_lock = threading.Lock()
+_language = DEFAULT_LANGUAGE
+
+def catalog(lang):
+    """Return the message catalog of lang, loading it on first use."""
+    with _catalogs_lock:
+        if lang not in _catalogs:
+            with open(os.path.join(CATALOG_DIR, f"{lang}.json"),
+                      encoding="utf-8") as f:
+                _catalogs[lang] = json.load(f)
+        return _catalogs[lang]
+
+def use(lang):
+    """Select the language of all following messages."""
+    global _language
+    if lang not in LANGUAGES:
+        raise ValueError(f"unknown language: {lang} "
+                         f"(available: {', '.join(LANGUAGES)})")
+    _language = lang
+
+def text(key, **values):
+    """The message key in the selected language, formatted with values."""
+    template = catalog(_language).get(key)
+    if template is None:
+        template = catalog(DEFAULT_LANGUAGE)[key]
+    return template.format(**values)
@@ -0,0 +1,182 @@
+"""
+metrics.py
+
+Per-stage instrumentation of conversions.
+
+The pipeline wraps each of its stages (probe, download, seek, signature,
+palette, encode, render, concat, piped, analyze) in stage(); while a
+Recorder is installed every stage produces one record:
+
+    {"stage": "palette", "job": "clip.gif", "ok": true, "time": ...,
+     "wall": 0.84, "cpu": 1.62, "peak_rss": 48234496,
+     "bytes_in": ..., "bytes_out": 6513}
+
+wall is elapsed seconds, cpu the user+system time of the child processes
+(yt-dlp, ffmpeg) that ended during the stage, from getrusage(RUSAGE_CHILDREN),
+and peak_rss the peak resident set size of the largest child so far. The
+child figures are process-wide, so they are exact when one job runs at a
+time and approximate when several run concurrently. bytes_in counts
+downloaded bytes and bytes_out written bytes, where the stage has any.
+
+Records go to a JSON lines file, a Prometheus text file (totals per
+stage, for node_exporter's textfile collector) and/or a hook callback:
+
+    import metrics
+    metrics.install(metrics.Recorder(hook=print))
+"""
+
+import os
+import sys
+import json
+import time
+import resource
+import threading
+import contextlib
+import contextvars
+
+PREFIX = "yt2gif_stage"
+
+_recorder = None
+_job = contextvars.ContextVar("yt2gif_job", default=None)
+_stage = contextvars.ContextVar("yt2gif_stage", default=None)
+
+def child_usage():
+    """(cpu seconds, peak rss bytes) of the finished child processes."""
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    # ru_maxrss is in kilobytes on Linux (bytes on macOS)
+    scale = 1 if sys.platform == "darwin" else 1024
+    return usage.ru_utime + usage.ru_stime, usage.ru_maxrss * scale
+
+class Recorder:
+    """Collects stage records and writes them to the configured sinks."""
+
+    def __init__(self, jsonl=None, prometheus=None, hook=None):
+        self.jsonl = jsonl
+        self.prometheus = prometheus
+        self.hook = hook
+        self.totals = {}
+        self._lock = threading.Lock()
+
+    def record(self, rec):
+        with self._lock:
+            self.add_totals(rec)
+            if self.jsonl == "-":
+                print(json.dumps(rec), file=sys.stderr)
+            elif self.jsonl:
+                with open(self.jsonl, "a") as f:
+                    f.write(json.dumps(rec) + "\n")
+            if self.prometheus:
+                self.write_prometheus()
+        if self.hook:
+            self.hook(rec)
+
+    def add_totals(self, rec):
+        t = self.totals.setdefault(rec["stage"], {
+            "runs": 0, "failures": 0, "seconds": 0.0, "cpu_seconds": 0.0,
+            "bytes_in": 0, "bytes_out": 0, "peak_rss_bytes": 0})
+        t["runs"] += 1
+        t["failures"] += not rec["ok"]
+        t["seconds"] += rec["wall"]
+        t["cpu_seconds"] += rec["cpu"]
+        t["bytes_in"] += rec.get("bytes_in") or 0
+        t["bytes_out"] += rec.get("bytes_out") or 0
+        t["peak_rss_bytes"] = max(t["peak_rss_bytes"], rec["peak_rss"])
+
+    def prometheus_text(self):
+        lines = []
+        for name, kind, help_text in (
+                ("runs", "counter", "Stage runs"),
+                ("failures", "counter", "Failed stage runs"),
+                ("seconds", "counter", "Wall time spent in the stage"),
+                ("cpu_seconds", "counter", "CPU time of the stage's child processes"),
+                ("bytes_in", "counter", "Bytes downloaded by the stage"),
+                ("bytes_out", "counter", "Bytes written by the stage"),
+                ("peak_rss_bytes", "gauge", "Peak RSS of the largest child process")):
+            metric = f"{PREFIX}_{name}" + ("_total" if kind == "counter" else "")
+            lines.append(f"# HELP {metric} {help_text}")
+            lines.append(f"# TYPE {metric} {kind}")
+            for stage, t in sorted(self.totals.items()):
+                lines.append(f'{metric}{{stage="{stage}"}} {t[name]}')
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self):
+        tmp = f"{self.prometheus}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            f.write(self.prometheus_text())
+        os.replace(tmp, self.prometheus)
+
+def install(recorder):
+    """Record the stages of all following conversions (None: stop)."""
+    global _recorder
+    _recorder = recorder
+
+@contextlib.contextmanager
+def job(name):
+    """Label the stages run by this thread (or task) with a job name."""
+    token = _job.set(name)
+    try:
+        yield
+    finally:
+        _job.reset(token)
+
+def current_job():
+    return _job.get()
+
+def current_stage():
+    """Name of the innermost stage running in this thread, or None."""
+    return _stage.get()
+
+@contextlib.contextmanager
+def stage(name, **labels):
+    """
+    Measure one stage. Yields the record, so the stage can add its byte
+    counts (bytes_in, bytes_out); only the stage name is tracked without
+    a recorder.
+    """
+    token = _stage.set(name)
+    try:
+        with _measure(name, labels) as rec:
+            yield rec
+    finally:
+        _stage.reset(token)
+
+@contextlib.contextmanager
+def _measure(name, labels):
+    recorder = _recorder
+    rec = {"stage": name, "job": _job.get(), **labels}
+    if recorder is None:
+        yield rec
+        return
+    cpu, _ = child_usage()
+    began = time.perf_counter()
+    rec["ok"] = False
+    try:
+        yield rec
+        rec["ok"] = True
+    finally:
+        end_cpu, peak_rss = child_usage()
+        rec.update(time=time.time(),
+                   wall=round(time.perf_counter() - began, 6),
+                   cpu=round(end_cpu - cpu, 6),
+                   peak_rss=peak_rss)
+        recorder.record(rec)
+
+def file_size(path):
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return None
+
+def add_arguments(parser):
+    """Add the --metrics flags to an argparse parser."""
+    parser.add_argument("--metrics", metavar="FILE",
+                        help="append per-stage timings as JSON lines to FILE "
+                             "(- for stderr)")
+    parser.add_argument("--metrics-prom", metavar="FILE",
+                        help="keep per-stage totals in FILE in Prometheus "
+                             "text format")
+
+def install_from_args(args):
+    """Install a Recorder for the --metrics flags, if any were given."""
+    if args.metrics or args.metrics_prom:
+        install(Recorder(jsonl=args.metrics, prometheus=args.metrics_prom))
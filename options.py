@@ -0,0 +1,160 @@
+"""
+options.py
+
+Render options: the settings that shape the GIF itself (frame rate, size,
+scaler, palette) and the ffmpeg filter strings they translate to.
+Every entry point (youtube2gif.py, main.py, batch.py and the library
+APIs) reads them through this module, so they accept the same flags and
+manifest fields.
+"""
+
+import argparse
+
+SCALERS = ("lanczos", "bicubic", "bilinear", "neighbor", "area", "spline")
+STATS_MODES = ("full", "diff", "single")
+DITHERS = ("sierra2_4a", "sierra2", "floyd_steinberg", "bayer", "heckbert",
+           "sierra3", "burkes", "atkinson", "none")
+DIFF_MODES = ("none", "rectangle")
+ENCODERS = ("ffmpeg", "python")
+
+class RenderOptions:
+    """
+    Frame rate, size and palette settings of one GIF. encoder "python"
+    replaces ffmpeg's palettegen/paletteuse by gifenc.py, which uses
+    max_colors but ignores stats_mode, dither and diff_mode.
+    """
+
+    FIELDS = ("fps", "width", "scaler", "max_colors", "stats_mode",
+              "dither", "diff_mode", "encoder")
+
+    def __init__(self, fps=10, width=320, scaler="lanczos", max_colors=256,
+                 stats_mode="full", dither="sierra2_4a", diff_mode="none",
+                 encoder="ffmpeg"):
+        self.fps = fps
+        self.width = width
+        self.scaler = scaler
+        self.max_colors = max_colors
+        self.stats_mode = stats_mode
+        self.dither = dither
+        self.diff_mode = diff_mode
+        self.encoder = encoder
+
+    def video_filter(self):
+        """Frame rate and scaling filters applied before the palette."""
+        return f"fps={self.fps},scale={self.width}:-1:flags={self.scaler}"
+
+    def palettegen(self):
+        args = []
+        if self.max_colors != 256:
+            args.append(f"max_colors={self.max_colors}")
+        if self.stats_mode != "full":
+            args.append(f"stats_mode={self.stats_mode}")
+        return "palettegen" + ("=" + ":".join(args) if args else "")
+
+    def paletteuse(self):
+        args = []
+        if self.dither != "sierra2_4a":
+            args.append(f"dither={self.dither}")
+        if self.diff_mode != "none":
+            args.append(f"diff_mode={self.diff_mode}")
+        return "paletteuse" + ("=" + ":".join(args) if args else "")
+
+    def palette_key(self):
+        """Everything a generated palette depends on."""
+        return f"{self.video_filter()}|{self.palettegen()}"
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.FIELDS}
+
+    def replace(self, **changes):
+        """Return a copy with some fields changed."""
+        values = self.as_dict()
+        values.update(changes)
+        return RenderOptions(**values)
+
+    def to_argv(self):
+        """Command line flags reproducing the non-default options."""
+        argv = []
+        for name, value in self.as_dict().items():
+            if value != DEFAULTS[name]:
+                argv += ["--" + name.replace("_", "-"), str(value)]
+        return argv
+
+    def __eq__(self, other):
+        return isinstance(other, RenderOptions) and \
+            self.as_dict() == other.as_dict()
+
+    def __repr__(self):
+        fields = ", ".join(f"{k}={v!r}" for k, v in self.as_dict().items())
+        return f"RenderOptions({fields})"
+
+DEFAULTS = RenderOptions().as_dict()
+
+def positive_number(value):
+    number = float(value)
+    if number <= 0:
+        raise argparse.ArgumentTypeError(f"must be positive: {value}")
+    return int(number) if number == int(number) else number
+
+def positive_int(value):
+    number = int(value)
+    if number <= 0:
+        raise argparse.ArgumentTypeError(f"must be positive: {value}")
+    return number
+
+def color_count(value):
+    count = int(value)
+    if not 2 <= count <= 256:
+        raise argparse.ArgumentTypeError(f"must be between 2 and 256: {value}")
+    return count
+
+def add_arguments(parser):
+    """Add the render option flags to an argparse parser."""
+    group = parser.add_argument_group("render options")
+    group.add_argument("--fps", type=positive_number, default=DEFAULTS["fps"],
+                       help="frames per second of the GIF (default: 10)")
+    group.add_argument("--width", type=positive_int, default=DEFAULTS["width"],
+                       help="width of the GIF in pixels (default: 320)")
+    group.add_argument("--scaler", choices=SCALERS, default=DEFAULTS["scaler"],
+                       help="scaling algorithm (default: lanczos)")
+    group.add_argument("--max-colors", type=color_count,
+                       default=DEFAULTS["max_colors"],
+                       help="palette size, 2-256 (default: 256)")
+    group.add_argument("--stats-mode", choices=STATS_MODES,
+                       default=DEFAULTS["stats_mode"],
+                       help="what the palette is computed from (default: full)")
+    group.add_argument("--dither", choices=DITHERS, default=DEFAULTS["dither"],
+                       help="dithering algorithm (default: sierra2_4a)")
+    group.add_argument("--diff-mode", choices=DIFF_MODES,
+                       default=DEFAULTS["diff_mode"],
+                       help="'rectangle' only re-encodes the changed area of each "
+                            "frame: faster and smaller for mostly static clips")
+    group.add_argument("--encoder", choices=ENCODERS, default=DEFAULTS["encoder"],
+                       help="'python' quantizes and writes the GIF in process "
+                            "(gifenc.py, faster with NumPy) instead of ffmpeg's "
+                            "paletteuse (default: ffmpeg)")
+
+def from_args(args):
+    """RenderOptions of argparse args parsed with add_arguments()."""
+    return RenderOptions(**{name: getattr(args, name) for name in DEFAULTS})
+
+class MappingParser(argparse.ArgumentParser):
+    """Parser raising ValueError instead of exiting on bad values."""
+
+    def error(self, message):
+        raise ValueError(message)
+
+def from_mapping(values):
+    """
+    RenderOptions from a dict of strings or values (a manifest row or
+    keyword arguments), validated like the command line. Unknown keys
+    are ignored; invalid values raise ValueError.
+    """
+    parser = MappingParser(add_help=False)
+    add_arguments(parser)
+    argv = []
+    for name in DEFAULTS:
+        value = values.get(name)
+        if value not in (None, ""):
+            argv += ["--" + name.replace("_", "-"), str(value)]
+    return from_args(parser.parse_args(argv))
@@ -0,0 +1,111 @@
+"""
+palettes.py
+
+Palette library shared by the clips of one source video.
+
+Adjacent clips of the same scene need nearly the same 256-color palette,
+so generating a fresh one for every clip is wasted work. Each clip gets a
+cheap color signature: a coarse RGB histogram of its keyframes, scaled
+down tiny, with the frames between them never decoded. If a stored
+palette was built from clips whose signature is close enough it is
+reused and the clip is encoded with paletteuse alone, otherwise a new
+palette is generated and added to the library.
+
+The library is a directory (next to the cached source video) holding the
+palette PNGs and an index.json, updated under a file lock so concurrent
+jobs can share it.
+"""
+
+import os
+import json
+import fcntl
+import shutil
+import threading
+
+# levels per RGB channel of the color signature (4 -> 64 bins)
+LEVELS = 4
+
+# frames per second and width of the keyframes sampled for the signature
+SAMPLE_FPS = 2
+SAMPLE_WIDTH = 32
+
+# default maximum signature distance (0..1) for reusing a palette
+DEFAULT_THRESHOLD = 0.15
+
+def histogram(rgb):
+    """Normalized coarse color histogram of raw rgb24 bytes."""
+    shift = 8 - (LEVELS - 1).bit_length()
+    bins = [0] * (LEVELS ** 3)
+    for i in range(0, len(rgb) - 2, 3):
+        r, g, b = rgb[i] >> shift, rgb[i + 1] >> shift, rgb[i + 2] >> shift
+        bins[(r * LEVELS + g) * LEVELS + b] += 1
+    total = sum(bins) or 1
+    return [count / total for count in bins]
+
+def distance(a, b):
+    """Total variation distance of two histograms: 0 same, 1 disjoint."""
+    return sum(abs(x - y) for x, y in zip(a, b)) / 2
+
+def library_dir(source):
+    """Directory of the palette library that belongs to a source video."""
+    return os.path.splitext(source)[0] + ".palettes"
+
+class PaletteLibrary:
+    """Palettes of one source, looked up by color signature."""
+
+    def __init__(self, root, threshold=DEFAULT_THRESHOLD):
+        self.root = root
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def index_path(self):
+        return os.path.join(self.root, "index.json")
+
+    def read_index(self):
+        try:
+            with open(self.index_path()) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return []
+
+    def locked(self):
+        """Lock file guarding index.json across processes."""
+        lock = open(os.path.join(self.root, ".lock"), "a")
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        return lock
+
+    def lookup(self, hist, render_key):
+        """
+        Return (palette path, distance) of the closest palette made for the
+        same render settings, or (None, distance) if none is close enough.
+        """
+        best, best_dist = None, 1.0
+        for entry in self.read_index():
+            if entry["render"] != render_key:
+                continue
+            dist = distance(hist, entry["hist"])
+            if dist < best_dist:
+                best, best_dist = entry, dist
+        if best is None or best_dist > self.threshold:
+            return None, best_dist
+        return os.path.join(self.root, best["palette"]), best_dist
+
+    def new_palette_path(self):
+        """A fresh temporary path to generate a palette into."""
+        return os.path.join(self.root,
+                            f".{os.getpid()}.{threading.get_ident()}.png")
+
+    def add(self, start, end, hist, render_key, palette):
+        """Move the generated palette file into the library."""
+        with self._lock, self.locked():
+            index = self.read_index()
+            name = f"palette_{len(index):04d}.png"
+            shutil.move(palette, os.path.join(self.root, name))
+            index.append({"start": start, "end": end, "render": render_key,
+                          "hist": hist, "palette": name})
+            tmp = self.index_path() + ".tmp"
+            with open(tmp, "w") as f:
+                json.dump(index, f)
+            os.replace(tmp, self.index_path())
+        return os.path.join(self.root, name)
@@ -0,0 +1,269 @@
+"""
+progress.py
+
+Live progress of the yt-dlp and ffmpeg processes, and stall detection.
+
+While a Reporter is installed, ffmpeg is started with `-progress pipe:N`
+on a private pipe and yt-dlp with a machine-readable progress template.
+Every update becomes a snapshot passed to the reporter's callback:
+
+    {"stage": "encode", "job": "clip.gif", "tool": "ffmpeg",
+     "frame": 120, "fps": 31.2, "speed": 2.1, "time": 4.0, "total": 10.0,
+     "percent": 40.0, "eta": 2.86, "bytes": 812345, "total_bytes": None}
+
+time and total are seconds of output (ffmpeg) and speed its multiple of
+real time; for yt-dlp bytes and total_bytes count the download and speed
+is in bytes per second. percent and eta are None when the total is not
+known. With a stall_timeout, a process that reports no progress at all
+for that many seconds is killed and StallError raised.
+"""
+
+import os
+import sys
+import time
+import subprocess
+import threading
+
+import metrics
+
+# yt-dlp progress line: marker, downloaded, total, estimated total, speed, eta
+YTDLP_MARKER = "yt2gif-progress"
+YTDLP_TEMPLATE = (f"download:{YTDLP_MARKER} %(progress.downloaded_bytes)s "
+                  "%(progress.total_bytes)s %(progress.total_bytes_estimate)s "
+                  "%(progress.speed)s %(progress.eta)s")
+
+# seconds between stall checks
+CHECK_INTERVAL = 0.5
+
+_reporter = None
+
+class StallError(Exception):
+    """A process made no progress for longer than the stall timeout."""
+
+class Reporter:
+    """Receives progress snapshots and sets the stall timeout."""
+
+    def __init__(self, callback=None, stall_timeout=None):
+        self.callback = callback
+        self.stall_timeout = stall_timeout
+
+    def report(self, snapshot):
+        if self.callback:
+            self.callback(snapshot)
+
+def install(reporter):
+    """Follow the progress of all following tool runs (None: stop)."""
+    global _reporter
+    _reporter = reporter
+
+def tool_of(cmd):
+    name = os.path.basename(cmd[0])
+    if name.startswith("ffmpeg"):
+        return "ffmpeg"
+    if name.startswith("yt-dlp"):
+        return "yt-dlp"
+    return None
+
+def output_duration(cmd):
+    """Seconds of output of an ffmpeg command (its -t), or None."""
+    for i, arg in enumerate(cmd[:-1]):
+        if arg == "-t":
+            try:
+                return float(cmd[i + 1])
+            except ValueError:
+                return None
+    return None
+
+def number(value):
+    try:
+        return float(str(value).rstrip("x"))
+    except ValueError:
+        return None
+
+class Watcher:
+    """
+    Follows one process: parses its progress on a reader thread and kills
+    it from a watchdog thread when it stalls. wait() replaces proc.wait().
+    """
+
+    def __init__(self, proc, tool, stream, reporter, total=None, echo=None):
+        self.proc = proc
+        self.tool = tool
+        self.reporter = reporter
+        self.echo = echo
+        self.stalled = False
+        self.last_report = time.monotonic()
+        self.snapshot = {"stage": metrics.current_stage(),
+                         "job": metrics.current_job(), "tool": tool,
+                         "frame": None, "fps": None, "speed": None,
+                         "time": None, "total": total, "percent": None,
+                         "eta": None, "bytes": None, "total_bytes": None}
+        self._fields = {}
+        self._threads = [threading.Thread(target=self.read, args=(stream,),
+                                          daemon=True)]
+        if reporter.stall_timeout:
+            self._threads.append(threading.Thread(target=self.watch,
+                                                  daemon=True))
+        for thread in self._threads:
+            thread.start()
+
+    def read(self, stream):
+        with stream:
+            for line in stream:
+                if self.tool == "ffmpeg":
+                    self.ffmpeg_line(line.strip())
+                elif line.startswith(YTDLP_MARKER):
+                    self.ytdlp_line(line.split()[1:])
+                elif self.echo:
+                    self.echo.write(line)
+
+    def ffmpeg_line(self, line):
+        key, _, value = line.partition("=")
+        self._fields[key] = value
+        if key != "progress":
+            return
+        f, self._fields = self._fields, {}
+        us = number(f.get("out_time_us") or f.get("out_time_ms"))
+        s = self.snapshot
+        s["frame"] = number(f.get("frame"))
+        s["fps"] = number(f.get("fps"))
+        s["speed"] = number(f.get("speed"))
+        s["bytes"] = number(f.get("total_size"))
+        s["time"] = us / 1e6 if us is not None and us >= 0 else None
+        if s["total"] and s["time"] is not None:
+            s["percent"] = min(100.0, 100.0 * s["time"] / s["total"])
+            if s["speed"]:
+                s["eta"] = max(0.0, (s["total"] - s["time"]) / s["speed"])
+        self.publish()
+
+    def ytdlp_line(self, fields):
+        done, total, estimate, speed, eta = (fields + [None] * 5)[:5]
+        s = self.snapshot
+        s["bytes"] = number(done)
+        s["total_bytes"] = number(total) or number(estimate)
+        s["speed"] = number(speed)
+        s["eta"] = number(eta)
+        if s["bytes"] is not None and s["total_bytes"]:
+            s["percent"] = min(100.0, 100.0 * s["bytes"] / s["total_bytes"])
+        self.publish()
+
+    def publish(self):
+        self.last_report = time.monotonic()
+        self.reporter.report(dict(self.snapshot))
+
+    def watch(self):
+        timeout = self.reporter.stall_timeout
+        while self.proc.poll() is None:
+            if time.monotonic() - self.last_report > timeout:
+                self.stalled = True
+                self.proc.kill()
+                return
+            time.sleep(CHECK_INTERVAL)
+
+    def wait(self):
+        rc = self.proc.wait()
+        for thread in self._threads:
+            thread.join()
+        if self.stalled:
+            raise StallError(f"no progress for {self.reporter.stall_timeout:g}s, "
+                             f"killed: {' '.join(self.proc.args)}")
+        return rc
+
+class Unwatched:
+    """Watcher stand-in for processes without progress reporting."""
+
+    def __init__(self, proc):
+        self.proc = proc
+
+    def wait(self):
+        return self.proc.wait()
+
+def popen(cmd, **kw):
+    """
+    Start cmd like subprocess.Popen, adding progress reporting for ffmpeg
+    and yt-dlp while a reporter is installed. Returns (proc, watcher);
+    call watcher.wait() instead of proc.wait(). yt-dlp's stdout is read
+    for its progress, so its other output is copied to the given stdout
+    (sys.stdout if None); pass a non-default stdout only for ffmpeg.
+    """
+    reporter = _reporter
+    tool = tool_of(cmd)
+    if reporter is None or tool is None:
+        proc = subprocess.Popen(cmd, **kw)
+        return proc, Unwatched(proc)
+    if tool == "ffmpeg":
+        r, w = os.pipe()
+        try:
+            proc = subprocess.Popen(
+                [cmd[0], "-progress", f"pipe:{w}", *cmd[1:]],
+                pass_fds=(w,), **kw)
+        finally:
+            os.close(w)
+        stream = os.fdopen(r, errors="replace")
+        return proc, Watcher(proc, tool, stream, reporter,
+                             total=output_duration(cmd))
+    echo = kw.pop("stdout", None) or sys.stdout
+    proc = subprocess.Popen(
+        [cmd[0], "--newline", "--progress-template", YTDLP_TEMPLATE, *cmd[1:]],
+        stdout=subprocess.PIPE, text=True, errors="replace", **kw)
+    return proc, Watcher(proc, tool, proc.stdout, reporter, echo=echo)
+
+def call(cmd, **kw):
+    """Run cmd to completion (see popen()); returns its exit code."""
+    proc, watcher = popen(cmd, **kw)
+    try:
+        return watcher.wait()
+    except BaseException:
+        if proc.poll() is None:
+            proc.kill()
+            proc.wait()
+        raise
+
+def describe(snapshot):
+    """One-line human-readable form of a snapshot."""
+    s = snapshot
+    parts = [f"{s['stage'] or s['tool']}:"]
+    if s["percent"] is not None:
+        parts.append(f"{s['percent']:5.1f}%")
+    if s["tool"] == "ffmpeg":
+        if s["frame"] is not None:
+            parts.append(f"frame {s['frame']:.0f}")
+        if s["fps"]:
+            parts.append(f"{s['fps']:.1f} fps")
+        if s["speed"]:
+            parts.append(f"{s['speed']:.2f}x")
+    else:
+        if s["bytes"] is not None:
+            parts.append(f"{s['bytes'] / 1e6:.1f} MB")
+        if s["speed"]:
+            parts.append(f"{s['speed'] / 1e6:.2f} MB/s")
+    if s["eta"] is not None:
+        parts.append(f"ETA {s['eta']:.0f}s")
+    return " ".join(parts)
+
+def print_snapshot(snapshot):
+    print(describe(snapshot), file=sys.stderr)
+
+def add_arguments(parser):
+    """Add the --progress and --stall-timeout flags to an argparse parser."""
+    parser.add_argument("--progress", action="store_true",
+                        help="print live fps, speed and ETA of every stage to stderr")
+    parser.add_argument("--stall-timeout", type=float, metavar="SEC",
+                        help="kill a yt-dlp/ffmpeg step that reports no progress "
+                             "for SEC seconds")
+
+def install_from_args(args, callback=None):
+    """
+    Install a Reporter for the flags, if any were given; callback receives
+    the snapshots in addition to the --progress printing.
+    """
+    if not (args.progress or args.stall_timeout or callback):
+        return
+
+    def report(snapshot):
+        if args.progress:
+            print_snapshot(snapshot)
+        if callback:
+            callback(snapshot)
+
+    install(Reporter(report, args.stall_timeout))
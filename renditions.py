@@ -0,0 +1,93 @@
+"""
+renditions.py
+
+Other formats rendered next to the GIF from the same decode: animated
+WebP, APNG and a short H.264 MP4 preview. A job lists them as outputs,
+paths whose extension names the format (or {"path": ..., "format": ...}
+objects). youtube2gif.render_outputs() then decodes and scales the slice
+once, and a split filter graph feeds that one stream to every encoder.
+
+    outputs = parse_outputs(["clip.webp", "clip.mp4"])
+    graph, out_args = output_graph("", opts, [("clip.gif", "gif")] + outputs)
+"""
+
+import os
+
+from options import RenderOptions
+
+FORMATS = ("gif", "webp", "apng", "mp4")
+EXTENSIONS = {".gif": "gif", ".webp": "webp", ".png": "apng",
+              ".apng": "apng", ".mp4": "mp4"}
+
+# encoder options of each format; the GIF's palette is part of the graph
+ENCODE_ARGS = {
+    "gif": ["-f", "gif"],
+    "webp": ["-c:v", "libwebp", "-quality", "75", "-loop", "0", "-f", "webp"],
+    "apng": ["-c:v", "apng", "-plays", "0", "-f", "apng"],
+    "mp4": ["-c:v", "libx264", "-preset", "veryfast", "-crf", "23",
+            "-pix_fmt", "yuv420p", "-movflags", "+faststart", "-f", "mp4"],
+}
+
+# H.264 in yuv420p needs an even frame size
+MP4_FILTER = "scale=trunc(iw/2)*2:trunc(ih/2)*2,format=yuv420p"
+
+def format_of(path):
+    """Format named by a path's extension; ValueError if there is none."""
+    fmt = EXTENSIONS.get(os.path.splitext(path)[1].lower())
+    if fmt is None:
+        raise ValueError(f"unknown output format: {path} "
+                         f"(use {', '.join(sorted(EXTENSIONS))})")
+    return fmt
+
+def parse_outputs(value):
+    """
+    [(path, format)] of a job's outputs: a list of paths, {"path",
+    "format"} objects and (path, format) pairs, or a comma-separated
+    string of paths (a CSV column or a flag). Raises ValueError for
+    unknown formats.
+    """
+    if not value:
+        return []
+    if isinstance(value, str):
+        value = [v.strip() for v in value.split(",") if v.strip()]
+    outputs = []
+    for item in value:
+        if isinstance(item, dict):
+            path, fmt = item.get("path"), item.get("format")
+        elif isinstance(item, (list, tuple)):
+            path, fmt = item
+        else:
+            path, fmt = item, None
+        if not path:
+            raise ValueError("an output needs a path")
+        path = str(path)
+        fmt = fmt or format_of(path)
+        if fmt not in FORMATS:
+            raise ValueError(f"unknown output format: {fmt} "
+                             f"(use {', '.join(FORMATS)})")
+        outputs.append((path, fmt))
+    return outputs
+
+def output_graph(prefix, opts, outputs):
+    """
+    (filter graph, output options) encoding every (path, format) of
+    outputs from one decode: [0:v] passes prefix (a trim, or "") and the
+    fps and scale filters of the RenderOptions once, then a split feeds
+    one branch per output.
+    """
+    opts = opts or RenderOptions()
+    n = len(outputs)
+    graph = [f"[0:v]{prefix}{opts.video_filter()},split={n}"
+             + "".join(f"[v{i}]" for i in range(n))]
+    out_args = []
+    for i, (path, fmt) in enumerate(outputs):
+        label = f"v{i}"
+        if fmt == "gif":
+            graph.append(f"[v{i}]split[a{i}][b{i}];[a{i}]{opts.palettegen()}[p{i}];"
+                         f"[b{i}][p{i}]{opts.paletteuse()}[o{i}]")
+            label = f"o{i}"
+        elif fmt == "mp4":
+            graph.append(f"[v{i}]{MP4_FILTER}[o{i}]")
+            label = f"o{i}"
+        out_args += ["-map", f"[{label}]", *ENCODE_ARGS[fmt], "-y", path]
+    return ";".join(graph), out_args
@@ -0,0 +1,54 @@
+"""
+scheduler.py
+
+Bounded concurrency for rendering many clips at once.
+
+Downloads are network-bound and encodes are CPU-bound, so they get separate
+limits: at most download_slots videos are fetched at the same time and at
+most encode_slots ffmpeg encoders run at the same time, each restricted to
+threads threads so that encode_slots * threads roughly matches the number
+of cores instead of every ffmpeg grabbing all of them.
+"""
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+class Scheduler:
+    """Thread pools and slot limits shared by all jobs of a run."""
+
+    def __init__(self, download_slots=4, encode_slots=None, threads=None):
+        cpus = os.cpu_count() or 1
+        self.download_slots = max(1, download_slots)
+        self.encode_slots = max(1, encode_slots or cpus // 2)
+        self.threads = max(1, threads or cpus // self.encode_slots)
+        self._downloads = threading.BoundedSemaphore(self.download_slots)
+        # a job thread holds one source open while its clips are encoded,
+        # so allow enough of them to keep both kinds of slots busy
+        self._jobs = ThreadPoolExecutor(
+            self.download_slots + self.encode_slots,
+            thread_name_prefix="yt2gif-job")
+        self._encoders = ThreadPoolExecutor(
+            self.encode_slots, thread_name_prefix="yt2gif-encode")
+
+    def download_slot(self):
+        """Context manager held while a video is being downloaded."""
+        return self._downloads
+
+    def submit(self, fn, *args, **kw):
+        """Run a whole job (download + encodes) on the job pool."""
+        return self._jobs.submit(fn, *args, **kw)
+
+    def encode(self, fn, *args, **kw):
+        """Run an encode on an encode slot, passing it the thread budget."""
+        return self._encoders.submit(fn, *args, threads=self.threads, **kw)
+
+    def shutdown(self, wait=True):
+        self._jobs.shutdown(wait=wait)
+        self._encoders.shutdown(wait=wait)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
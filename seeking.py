@@ -0,0 +1,110 @@
+"""
+seeking.py
+
+Keyframe-aware seeking.
+
+Where an input `-ss` lands depends on the keyframe layout of the source:
+without an index the demuxer may scan to find it, and everything between
+the keyframe and the requested start has to be decoded and thrown away.
+This module probes the keyframe positions of a file once (packet headers
+only, nothing is decoded), caches them per file, and turns a start time
+into an exact seek to the preceding keyframe plus a frame-accurate trim,
+reporting how much video had to be decoded just to reach the start.
+"""
+
+import os
+import json
+import time
+import bisect
+import subprocess
+import threading
+
+def keyframes_command(ffprobe, path):
+    return [ffprobe,
+            "-v", "error",
+            "-select_streams", "v:0",
+            "-show_entries", "packet=pts_time,flags:format=start_time",
+            "-of", "json",
+            path]
+
+def parse_keyframes(output):
+    """
+    Parse keyframes_command() output into sorted keyframe times, relative
+    to the file's start time like ffmpeg's -ss.
+    """
+    try:
+        data = json.loads(output)
+    except ValueError:
+        return []
+    offset = float(data.get("format", {}).get("start_time") or 0)
+    times = []
+    for packet in data.get("packets", []):
+        pts = packet.get("pts_time")
+        if "K" in packet.get("flags", "") and pts not in (None, "N/A"):
+            times.append(float(pts) - offset)
+    return sorted(times)
+
+class KeyframeIndex:
+    """
+    Keyframe times of video files, probed once per file version
+    (path, size, mtime) and shared by all jobs of the process.
+    """
+
+    def __init__(self, ffprobe):
+        self.ffprobe = ffprobe
+        self._lock = threading.Lock()
+        self._index = {}
+
+    def file_id(self, path):
+        st = os.stat(path)
+        return (os.path.realpath(path), st.st_size, st.st_mtime_ns)
+
+    def keyframes(self, path):
+        """Return the sorted keyframe times of path ([] if unknown)."""
+        ident = self.file_id(path)
+        with self._lock:
+            if ident in self._index:
+                return self._index[ident]
+        res = subprocess.run(keyframes_command(self.ffprobe, path),
+                             capture_output=True, text=True)
+        times = parse_keyframes(res.stdout) if res.returncode == 0 else []
+        with self._lock:
+            self._index[ident] = times
+        return times
+
+    def plan(self, path, start):
+        """
+        Return a seek plan for start seconds into path:
+            {"keyframe": time to seek to (a keyframe <= start),
+             "preroll": seconds decoded and dropped before start,
+             "probe_time": seconds spent probing (0 when cached)}
+        or None if the keyframes of path are unknown.
+        """
+        began = time.perf_counter()
+        times = self.keyframes(path)
+        probe_time = time.perf_counter() - began
+        if not times:
+            return None
+        i = bisect.bisect_right(times, start) - 1
+        keyframe = times[max(i, 0)]
+        if keyframe > start:
+            keyframe = start  # start lies before the first keyframe
+        return {"keyframe": keyframe,
+                "preroll": start - keyframe,
+                "probe_time": probe_time}
+
+def describe(plan):
+    """One-line seek cost report of a plan."""
+    return (f"Seek: keyframe at {plan['keyframe']:.3f}s, "
+            f"{plan['preroll']:.3f}s decoded before the clip "
+            f"(index probe {plan['probe_time']:.3f}s)")
+
+_shared = {}
+_shared_lock = threading.Lock()
+
+def shared_index(ffprobe):
+    """The process-wide KeyframeIndex for ffprobe."""
+    with _shared_lock:
+        if ffprobe not in _shared:
+            _shared[ffprobe] = KeyframeIndex(ffprobe)
+        return _shared[ffprobe]
@@ -0,0 +1,100 @@
+"""A small GIF decoder, to check what gifenc.py writes."""
+
+import struct
+
+def lzw_decompress(data, min_code_size):
+    """
+    Indices of GIF LZW data (without the block framing), and the number
+    of clear codes met after the first one.
+    """
+    clear, end = 1 << min_code_size, (1 << min_code_size) + 1
+    out = bytearray()
+    clears = -1
+    table, prev = [], None
+    code_size = min_code_size + 1
+    acc = bits = pos = 0
+    while True:
+        while bits < code_size:
+            if pos == len(data):
+                raise ValueError("LZW data without an end code")
+            acc |= data[pos] << bits
+            bits += 8
+            pos += 1
+        code = acc & ((1 << code_size) - 1)
+        acc >>= code_size
+        bits -= code_size
+        if code == clear:
+            table = [bytes([i]) for i in range(clear)] + [b"", b""]
+            code_size = min_code_size + 1
+            prev = None
+            clears += 1
+            continue
+        if code == end:
+            return bytes(out), clears
+        if prev is None:
+            entry = table[code]
+        else:
+            if code < len(table):
+                entry = table[code]
+            elif code == len(table):
+                entry = prev + prev[:1]
+            else:
+                raise ValueError(f"bad LZW code {code}")
+            if len(table) < 4096:
+                table.append(prev + entry[:1])
+                if len(table) == 1 << code_size and code_size < 12:
+                    code_size += 1
+        out += entry
+        prev = entry
+
+def read_sub_blocks(data, pos):
+    """(joined data of the sub-blocks at pos, position after them)."""
+    chunks = []
+    while data[pos]:
+        chunks.append(data[pos + 1:pos + 1 + data[pos]])
+        pos += data[pos] + 1
+    return b"".join(chunks), pos + 1
+
+def decode(data):
+    """
+    The frames of a GIF as they appear on screen: [(rgb24 bytes of the
+    whole canvas, delay in centiseconds)]. Handles the disposal methods
+    gifenc writes (none and leave in place).
+    """
+    if data[:6] != b"GIF89a":
+        raise ValueError("not a GIF89a")
+    width, height, flags = struct.unpack("<HHB", data[6:11])
+    pos = 13
+    table = b""
+    if flags & 0x80:
+        table = data[pos:pos + (3 << ((flags & 7) + 1))]
+        pos += len(table)
+    canvas = bytearray(width * height * 3)
+    frames = []
+    delay, transparent = 0, None
+    while data[pos] != 0x3B:
+        if data[pos] == 0x21:
+            if data[pos + 1] == 0xF9:
+                packed, delay, index = struct.unpack("<BHB", data[pos + 3:pos + 7])
+                transparent = index if packed & 1 else None
+            _, pos = read_sub_blocks(data, pos + 2)
+            continue
+        if data[pos] != 0x2C:
+            raise ValueError(f"bad GIF block 0x{data[pos]:02x} at {pos}")
+        left, top, w, h, flags = struct.unpack("<HHHHB", data[pos + 1:pos + 10])
+        pos += 10
+        colors = table
+        if flags & 0x80:
+            colors = data[pos:pos + (3 << ((flags & 7) + 1))]
+            pos += len(colors)
+        min_code_size = data[pos]
+        lzw, pos = read_sub_blocks(data, pos + 1)
+        indices, _ = lzw_decompress(lzw, min_code_size)
+        for i, index in enumerate(indices[:w * h]):
+            if index == transparent:
+                continue
+            at = ((top + i // w) * width + left + i % w) * 3
+            canvas[at:at + 3] = colors[index * 3:index * 3 + 3]
+        frames.append((bytes(canvas), delay))
+        delay, transparent = 0, None
+    return frames
@@ -0,0 +1,15 @@
+from budget import candidates
+from options import RenderOptions
+
+def test_first_candidate_is_the_requested_options():
+    base = RenderOptions(dither="floyd_steinberg", max_colors=100)
+    assert candidates(base)[0] == base
+
+def test_only_smaller_colors_and_lighter_dithers_are_tried():
+    found = candidates(RenderOptions(dither="bayer", max_colors=100))
+    assert {o.max_colors for o in found} == {100, 64, 32}
+    assert {o.dither for o in found} == {"bayer", "none"}
+
+def test_no_dither_is_never_raised():
+    found = candidates(RenderOptions(dither="none", max_colors=16))
+    assert {(o.max_colors, o.dither) for o in found} == {(16, "none")}
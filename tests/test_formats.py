@@ -0,0 +1,96 @@
+from formats import FormatPolicy
+
+# trimmed `yt-dlp -J` format entries of a YouTube video
+STORYBOARD = {"format_id": "sb0", "ext": "mhtml", "vcodec": "none",
+              "acodec": "none", "protocol": "mhtml", "url": "https://i.ytimg.com/sb"}
+AUDIO = {"format_id": "140", "ext": "m4a", "vcodec": "none", "acodec": "mp4a.40.2",
+         "tbr": 129.5, "protocol": "https", "url": "https://rr.example/140"}
+MUXED_360 = {"format_id": "18", "ext": "mp4", "vcodec": "avc1.42001E",
+             "acodec": "mp4a.40.2", "width": 640, "height": 360, "tbr": 404.4,
+             "protocol": "https", "url": "https://rr.example/18"}
+AVC_240 = {"format_id": "133", "ext": "mp4", "vcodec": "avc1.4d4015",
+           "acodec": "none", "width": 426, "height": 240, "tbr": 110.1,
+           "protocol": "https", "url": "https://rr.example/133"}
+VP9_240 = {"format_id": "242", "ext": "webm", "vcodec": "vp9", "acodec": "none",
+           "width": 426, "height": 240, "tbr": 95.2, "protocol": "https",
+           "url": "https://rr.example/242"}
+AVC_480 = {"format_id": "135", "ext": "mp4", "vcodec": "avc1.4d401e",
+           "acodec": "none", "width": 854, "height": 480, "tbr": 350.0,
+           "protocol": "https", "url": "https://rr.example/135"}
+AVC_144 = {"format_id": "160", "ext": "mp4", "vcodec": "avc1.4d400c",
+           "acodec": "none", "width": 256, "height": 144, "tbr": 50.3,
+           "protocol": "https", "url": "https://rr.example/160"}
+AV1_240 = {"format_id": "395", "ext": "mp4", "vcodec": "av01.0.00M.08",
+           "acodec": "none", "width": 426, "height": 240, "tbr": 80.0,
+           "protocol": "https", "url": "https://rr.example/395"}
+HLS_720 = {"format_id": "hls-720", "ext": "mp4", "vcodec": "avc1.64001F",
+           "acodec": "none", "width": 1280, "height": 720, "tbr": 1500.0,
+           "protocol": "m3u8_native", "url": "https://manifest.example/720.m3u8"}
+
+YOUTUBE = [STORYBOARD, AUDIO, MUXED_360, AVC_144, AV1_240, VP9_240, AVC_240,
+           AVC_480]
+
+def test_prefers_video_only_over_muxed():
+    policy = FormatPolicy(target_width=320)
+    assert policy.select([MUXED_360, AVC_480])["format_id"] == "135"
+
+def test_muxed_when_video_only_is_disabled():
+    policy = FormatPolicy(target_width=600, video_only=False)
+    assert policy.select([MUXED_360, AVC_480])["format_id"] == "18"
+
+def test_muxed_when_it_is_the_only_video():
+    assert FormatPolicy().select([AUDIO, MUXED_360])["format_id"] == "18"
+
+def test_narrowest_stream_wide_enough():
+    policy = FormatPolicy(target_width=320)
+    assert policy.select([AVC_480, AVC_240, AVC_144])["format_id"] == "133"
+
+def test_widest_stream_when_all_are_too_small():
+    policy = FormatPolicy(target_width=1920)
+    assert policy.select([AVC_144, AVC_240, AVC_480])["format_id"] == "135"
+
+def test_too_small_ranks_after_wide_enough():
+    policy = FormatPolicy(target_width=400)
+    assert policy.sort_key(AVC_240) < policy.sort_key(AVC_144)
+    assert policy.sort_key(AVC_480) < policy.sort_key(AVC_144)
+
+def test_codec_order_breaks_width_ties():
+    assert FormatPolicy(target_width=320).select(YOUTUBE)["format_id"] == "133"
+    av1_first = FormatPolicy(target_width=320,
+                             prefer_codecs=("av01", "avc1", "vp9"))
+    assert av1_first.select(YOUTUBE)["format_id"] == "395"
+
+def test_unknown_codec_ranks_last():
+    policy = FormatPolicy()
+    assert policy.codec_rank({"vcodec": "hev1.1.6.L93"}) == len(policy.prefer_codecs)
+
+def test_bitrate_breaks_remaining_ties():
+    cheap = dict(AVC_240, format_id="cheap", tbr=60.0)
+    assert FormatPolicy().select([AVC_240, cheap])["format_id"] == "cheap"
+
+def test_missing_width_counts_as_too_small():
+    no_width = dict(AVC_240, format_id="nowidth", width=None)
+    policy = FormatPolicy(target_width=320)
+    assert policy.select([no_width, AVC_480])["format_id"] == "135"
+    assert policy.select([no_width])["format_id"] == "nowidth"
+
+def test_generic_extractor_without_codecs():
+    plain = {"format_id": "mp4", "ext": "mp4", "url": "https://cdn.example/clip.mp4"}
+    assert FormatPolicy().select([plain]) is plain
+
+def test_no_video():
+    assert FormatPolicy().select([]) is None
+    assert FormatPolicy().select([STORYBOARD, AUDIO]) is None
+
+def test_storyboards_and_audio_are_not_video():
+    policy = FormatPolicy()
+    assert not policy.is_video(STORYBOARD)
+    assert not policy.is_video(AUDIO)
+    assert policy.candidates(YOUTUBE) == [AVC_144, AV1_240, VP9_240, AVC_240, AVC_480]
+
+def test_is_seekable():
+    assert FormatPolicy.is_seekable(AVC_240)
+    assert FormatPolicy.is_seekable(HLS_720)
+    assert FormatPolicy.is_seekable({"url": "https://cdn.example/clip.mp4"})
+    assert not FormatPolicy.is_seekable(dict(AVC_240, protocol="http_dash_segments"))
+    assert not FormatPolicy.is_seekable(dict(AVC_240, url=None))
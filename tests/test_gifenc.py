@@ -0,0 +1,100 @@
+import io
+import random
+
+import pytest
+
+import gifenc
+from gifdecode import decode, lzw_decompress as decompress
+
+WIDTH, HEIGHT = 32, 24
+BACKGROUND, COLORS = (0, 0, 0), [(255, 0, 0), (0, 255, 0), (0, 0, 255)]
+
+def square_frame(x, color, size=6):
+    """rgb24 frame of a static background with a square at column x."""
+    frame = bytearray(bytes(BACKGROUND) * WIDTH * HEIGHT)
+    for y in range(8, 8 + size):
+        for col in range(x, x + size):
+            at = (y * WIDTH + col) * 3
+            frame[at:at + 3] = bytes(color)
+    return bytes(frame)
+
+# a square moving over a static background, changing color as it goes
+MOVING = [square_frame(2 * t, COLORS[t % 3]) for t in range(12)]
+
+def encode(frames, fps=10, **kw):
+    out = io.BytesIO()
+    gifenc.encode(frames, WIDTH, HEIGHT, fps, out, **kw)
+    return out.getvalue()
+
+def test_optimized_frames_are_smaller():
+    assert len(encode(MOVING)) < len(encode(MOVING, optimize_frames=False))
+
+def test_duplicate_frames_lengthen_the_delay():
+    a, b = MOVING[:2]
+    decoded = decode(encode([a, a, a, b, b]))
+    assert [delay for _, delay in decoded] == [30, 20]
+    assert [frame for frame, _ in decoded] == [a, b]
+
+def test_duplicates_are_kept_without_optimization():
+    a, b = MOVING[:2]
+    decoded = decode(encode([a, a, b], optimize_frames=False))
+    assert [delay for _, delay in decoded] == [10, 10, 10]
+
+def test_composited_frames_match_the_unoptimized_ones():
+    optimized = decode(encode(MOVING))
+    plain = decode(encode(MOVING, optimize_frames=False))
+    # a handful of pure colors survives quantization exactly
+    assert [frame for frame, _ in plain] == MOVING
+    assert [frame for frame, _ in optimized] == MOVING
+
+def test_streamed_encoder_matches_encode():
+    palette = gifenc.palette_for(MOVING[::4])
+    out = io.BytesIO()
+    encoder = gifenc.Encoder(out, WIDTH, HEIGHT, 10, palette)
+    for frame in MOVING:
+        encoder.add(frame)
+    encoder.close()
+    assert out.getvalue() == encode(iter(MOVING), palette=palette)
+    assert [frame for frame, _ in decode(out.getvalue())] == MOVING
+
+def lzw_round_trip(indices, min_code_size):
+    data = gifenc.lzw_compress(bytes(indices), min_code_size)
+    return decompress(data, min_code_size)
+
+@pytest.mark.parametrize("min_code_size", [2, 3, 4, 8])
+def test_lzw_round_trip(min_code_size):
+    rng = random.Random(min_code_size)
+    colors = 1 << min_code_size
+    cases = [[], [colors - 1], [0] * 300,   # a run decodes as code == table size
+             [i % colors for i in range(1000)],
+             [rng.randrange(colors) for _ in range(2000)]]
+    for indices in cases:
+        assert lzw_round_trip(indices, min_code_size) == (bytes(indices), 0)
+
+@pytest.mark.parametrize("min_code_size", [2, 8])
+def test_lzw_clears_a_full_table(min_code_size):
+    rng = random.Random(min_code_size)
+    indices = bytes(rng.randrange(1 << min_code_size) for _ in range(60000))
+    decoded, clears = lzw_round_trip(indices, min_code_size)
+    assert decoded == indices
+    assert clears > 0
+
+def test_concat_keeps_every_frame():
+    first, second = encode(MOVING[:5]), encode(MOVING[5:])
+    out = io.BytesIO()
+    gifenc.concat([first, second], out)
+    frames = [frame for frame, _ in decode(out.getvalue())]
+    assert frames == MOVING
+
+def test_concat_adds_local_tables_for_other_palettes():
+    gray = [bytes([v]) * (WIDTH * HEIGHT * 3) for v in (40, 80, 120)]
+    first, second = encode(MOVING[:4]), encode(gray)
+    out = io.BytesIO()
+    gifenc.concat([first, second, first], out)
+    _, table, found = gifenc.blocks(out.getvalue())
+    images = [block for kind, block in found if kind == 0x2C]
+    assert table == gifenc.blocks(first)[1]
+    assert [bool(image[9] & 0x80) for image in images] == \
+        [False] * 4 + [True] * 3 + [False] * 4
+    assert [frame for frame, _ in decode(out.getvalue())] == \
+        MOVING[:4] + gray + MOVING[:4]
@@ -0,0 +1,111 @@
+import os
+import json
+import shutil
+import threading
+import subprocess
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+
+import pytest
+
+from youtube2gif import download_section, SECTION_PAD
+
+FFMPEG, FFPROBE = shutil.which("ffmpeg"), shutil.which("ffprobe")
+pytestmark = pytest.mark.skipif(not (FFMPEG and FFPROBE),
+                                reason="needs ffmpeg and ffprobe")
+
+# the fixture: 30 s of testsrc with a keyframe every second
+FIXTURE_SECONDS, FPS = 30, 25
+
+class RangeHandler(SimpleHTTPRequestHandler):
+    """Serves files with byte ranges, as video hosts do."""
+
+    # first byte of every request
+    starts = []
+
+    def send_head(self):
+        path = self.translate_path(self.path)
+        if not os.path.isfile(path):
+            self.send_error(404)
+            return None
+        size = os.path.getsize(path)
+        first, last = 0, size - 1
+        ranged = self.headers.get("Range", "").startswith("bytes=")
+        if ranged:
+            begin, _, end = self.headers["Range"][6:].partition("-")
+            first = int(begin or 0)
+            last = min(int(end), size - 1) if end else size - 1
+        RangeHandler.starts.append(first)
+        f = open(path, "rb")
+        f.seek(first)
+        self.send_response(206 if ranged else 200)
+        self.send_header("Content-Type", "video/mp4")
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("Content-Length", str(last - first + 1))
+        if ranged:
+            self.send_header("Content-Range", f"bytes {first}-{last}/{size}")
+        self.end_headers()
+        self.remaining = last - first + 1
+        return f
+
+    def copyfile(self, source, outputfile):
+        while self.remaining > 0:
+            chunk = source.read(min(self.remaining, 64 * 1024))
+            if not chunk:
+                break
+            try:
+                outputfile.write(chunk)
+            except (BrokenPipeError, ConnectionResetError):
+                break  # ffmpeg closed the connection to seek elsewhere
+            self.remaining -= len(chunk)
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture(scope="module")
+def server(tmp_path_factory):
+    root = tmp_path_factory.mktemp("www")
+    subprocess.run([FFMPEG, "-v", "error",
+                    "-f", "lavfi",
+                    "-i", f"testsrc=duration={FIXTURE_SECONDS}:size=160x90:rate={FPS}",
+                    "-c:v", "mpeg4", "-g", str(FPS), "-movflags", "+faststart",
+                    "-y", str(root / "fixture.mp4")], check=True)
+    httpd = ThreadingHTTPServer(
+        ("127.0.0.1", 0),
+        lambda *args: RangeHandler(*args, directory=str(root)))
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_port}", root / "fixture.mp4"
+    httpd.shutdown()
+    httpd.server_close()
+
+def duration_of(path):
+    out = subprocess.run([FFPROBE, "-v", "error", "-show_entries",
+                          "format=duration", "-of", "json", str(path)],
+                         capture_output=True, check=True).stdout
+    return float(json.loads(out)["format"]["duration"])
+
+def test_fetches_only_the_padded_slice(server, tmp_path):
+    base, fixture = server
+    mp4 = tmp_path / "slice.mp4"
+    RangeHandler.starts.clear()
+    offset = download_section(FFMPEG, f"{base}/fixture.mp4", 20, 3, str(mp4))
+    assert offset == SECTION_PAD
+    wanted = SECTION_PAD + 3 + SECTION_PAD
+    # stream copy starts at the keyframe before the fetch, at most 1 s early
+    assert wanted - 0.1 <= duration_of(mp4) <= wanted + 1.1
+    # ffmpeg jumped to the slice instead of reading the file through
+    assert max(RangeHandler.starts) > os.path.getsize(fixture) / 2
+
+def test_offset_near_the_start(server, tmp_path):
+    base, _ = server
+    mp4 = tmp_path / "slice.mp4"
+    assert download_section(FFMPEG, f"{base}/fixture.mp4", 0.5, 2,
+                            str(mp4)) == 0.5
+
+def test_failed_fetch_removes_the_partial_file(server, tmp_path):
+    base, _ = server
+    mp4 = tmp_path / "slice.mp4"
+    mp4.write_bytes(b"partial")
+    assert download_section(FFMPEG, f"{base}/missing.mp4", 20, 3,
+                            str(mp4)) is None
+    assert not mp4.exists()
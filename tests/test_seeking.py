@@ -0,0 +1,120 @@
+import json
+import stat
+
+import pytest
+
+from seeking import KeyframeIndex, parse_keyframes, describe
+
+def probe_output(packets, start_time="0.000000"):
+    """keyframes_command() output for (pts_time, flags) packets."""
+    return json.dumps({
+        "packets": [{"pts_time": pts, "flags": flags} for pts, flags in packets],
+        "format": {"start_time": start_time},
+    })
+
+def gop(keyframes, duration, fps=25):
+    """Packets of a stream with keyframes at the given times."""
+    packets = []
+    for frame in range(round(duration * fps)):
+        t = frame / fps
+        flags = "K__" if any(abs(t - k) < 1e-9 for k in keyframes) else "___"
+        packets.append((f"{t:.6f}", flags))
+    return packets
+
+# fixed 2 s GOPs, as x264 writes with -g 50 at 25 fps
+FIXED = probe_output(gop([0, 2, 4, 6, 8], 10))
+# scene-cut keyframes at irregular times
+VARIABLE = probe_output(gop([0, 0.6, 5.2, 5.48, 9], 10))
+# MPEG-TS style: the stream starts at 1.4 s and the first frame is no keyframe
+OFFSET = probe_output([("1.400000", "___"), ("1.440000", "___"),
+                       ("1.480000", "K__"), ("3.480000", "K__"),
+                       ("5.480000", "K__")], start_time="1.400000")
+# B-frames: packets come in decode order, not presentation order
+REORDERED = probe_output([("0.000000", "K__"), ("0.120000", "___"),
+                          ("0.040000", "___"), ("2.000000", "K__"),
+                          ("1.960000", "___"), ("N/A", "K__")])
+
+def test_parse_fixed_gop():
+    assert parse_keyframes(FIXED) == [0.0, 2.0, 4.0, 6.0, 8.0]
+
+def test_parse_variable_gop():
+    assert parse_keyframes(VARIABLE) == pytest.approx([0.0, 0.6, 5.2, 5.48, 9.0])
+
+def test_parse_is_relative_to_start_time():
+    assert parse_keyframes(OFFSET) == pytest.approx([0.08, 2.08, 4.08])
+
+def test_parse_sorts_and_skips_missing_pts():
+    assert parse_keyframes(REORDERED) == [0.0, 2.0]
+
+def test_parse_unusable_output():
+    assert parse_keyframes("") == []
+    assert parse_keyframes("not json") == []
+    assert parse_keyframes(json.dumps({"packets": []})) == []
+
+@pytest.fixture
+def index(tmp_path):
+    """KeyframeIndex(probe output) using a stub ffprobe that logs its calls."""
+    def make(output):
+        (tmp_path / "probe.json").write_text(output)
+        ffprobe = tmp_path / "ffprobe"
+        ffprobe.write_text(f"#!/bin/sh\necho x >> {tmp_path / 'calls'}\n"
+                           f"cat {tmp_path / 'probe.json'}\n")
+        ffprobe.chmod(ffprobe.stat().st_mode | stat.S_IEXEC)
+        video = tmp_path / "video.mp4"
+        video.write_bytes(b"\0" * 1024)
+        return KeyframeIndex(str(ffprobe)), str(video)
+    return make
+
+def calls(tmp_path):
+    path = tmp_path / "calls"
+    return len(path.read_text().split()) if path.exists() else 0
+
+def test_plan_between_keyframes(index):
+    keyframes, video = index(FIXED)
+    plan = keyframes.plan(video, 5.3)
+    assert plan["keyframe"] == 4.0
+    assert plan["preroll"] == pytest.approx(1.3)
+
+def test_plan_exactly_on_a_keyframe(index):
+    keyframes, video = index(FIXED)
+    plan = keyframes.plan(video, 6.0)
+    assert plan["keyframe"] == 6.0
+    assert plan["preroll"] == 0.0
+
+def test_plan_variable_gop(index):
+    keyframes, video = index(VARIABLE)
+    assert keyframes.plan(video, 5.47)["keyframe"] == pytest.approx(5.2)
+    assert keyframes.plan(video, 5.48)["keyframe"] == pytest.approx(5.48)
+    assert keyframes.plan(video, 8.99)["keyframe"] == pytest.approx(5.48)
+    assert keyframes.plan(video, 30)["keyframe"] == pytest.approx(9.0)
+
+def test_plan_before_the_first_keyframe(index):
+    keyframes, video = index(OFFSET)
+    plan = keyframes.plan(video, 0.05)
+    assert plan["keyframe"] == 0.05
+    assert plan["preroll"] == 0.0
+
+def test_plan_with_start_time(index):
+    keyframes, video = index(OFFSET)
+    plan = keyframes.plan(video, 3.0)
+    assert plan["keyframe"] == pytest.approx(2.08)
+    assert plan["preroll"] == pytest.approx(0.92)
+
+def test_plan_unknown_keyframes(index):
+    keyframes, video = index(json.dumps({"packets": []}))
+    assert keyframes.plan(video, 3.0) is None
+
+def test_probe_once_per_file_version(index, tmp_path):
+    keyframes, video = index(FIXED)
+    keyframes.plan(video, 1.0)
+    plan = keyframes.plan(video, 3.0)
+    assert calls(tmp_path) == 1
+    assert plan["probe_time"] < 0.05
+    with open(video, "ab") as f:
+        f.write(b"\0")
+    keyframes.plan(video, 3.0)
+    assert calls(tmp_path) == 2
+
+def test_describe():
+    line = describe({"keyframe": 4.0, "preroll": 1.3, "probe_time": 0.01})
+    assert line.startswith("Seek: keyframe at 4.000s, 1.300s decoded")
@@ -7,7 +7,42 @@ System dependencies (install if you don't have them):
     sudo apt install yt-dlp ffmpeg
 
 Usage:
-    python3 youtube2gif.py URL [start_sec] [duration_sec] [output.gif]
+    python3 youtube2gif.py URL [start_sec] [duration_sec] [output.gif|-]
+                                [--full] [--output FILE] [--lang LANG]
+                                [--full-download] [--two-pass] [--pipe]
+                                [--parallel N] [--outputs FILE,...]
+                                [--max-bytes SIZE] [--fps N] [--width PX]
+                                [--scaler S] [--max-colors N] [--stats-mode M]
+                                [--dither D] [--diff-mode rectangle]
+                                [--encoder python]
+                                [--metrics FILE] [--metrics-prom FILE]
+                                [--progress] [--stall-timeout SEC]
+
+--full converts from start_sec to the end of the video, and --output is
+the same as the output argument. Only the part of the video covering the
+requested slice is fetched; use --full-download to always download the
+whole video first. The palette and the GIF are produced from a single
+decode; --two-pass restores the classic palettegen-then-paletteuse run.
+With "-" as output the GIF is streamed to stdout as it is encoded,
+without writing it (or the palette) to disk.
+--pipe skips the local video file too: yt-dlp's output is piped straight
+into ffmpeg, which starts encoding as soon as the first bytes arrive.
+--parallel N splits a long slice at keyframes into segments that N ffmpeg
+processes encode at once with one shared palette, and joins the results.
+--outputs clip.webp,clip.mp4 also renders an animated WebP, APNG (.png)
+or MP4 preview of the slice, from the same decode as the GIF (see
+renditions.py).
+--max-bytes SIZE lowers fps, width, colors and dithering just enough for
+the GIF to fit into SIZE (e.g. 2M), reporting the trial encodes needed.
+The render options (--fps, --width, --scaler, --max-colors, --stats-mode,
+--dither, --diff-mode, --encoder) are shared with main.py, batch.py and
+the library APIs; see options.py. --encoder python quantizes and writes
+the GIF in process (gifenc.py) from raw frames decoded by ffmpeg.
+--lang selects the language of the messages.
+--metrics and --metrics-prom record the wall time, CPU time, memory and
+bytes of every stage (see metrics.py). --progress prints the live fps,
+speed and ETA of each step, and --stall-timeout SEC aborts a step that
+reports no progress for SEC seconds (see progress.py).
 
 Example:
     python3 youtube2gif.py https://youtu.be/kX8hfK0PrHM 10 5 clip.gif
@@ -18,71 +53,1104 @@ import os
 import subprocess
 import tempfile
 import shutil
+import argparse
+import json
+import threading
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
+
+import budget
+import gifenc
+import messages
+import metrics
+import palettes
+import progress
+import renditions
+from formats import FormatPolicy
+from messages import text
+from options import RenderOptions, add_arguments as add_render_arguments, from_args
+from seeking import shared_index, describe as describe_seek
+from cache import (SourceCache, ResultCache, source_key, size_argument,
+                   default_cache_dir)
+
+# seconds fetched on each side of a section download, so the keyframe
+# preceding the slice and the trailing frames are always included
+SECTION_PAD = 2.0
+
+# seconds added to keyframe seek targets (far below one frame)
+SEEK_EPSILON = 0.0005
+
+# frames sampled from a slice for the palette of the python encoder
+PALETTE_FRAMES = 32
+
+# bytes read from ffmpeg per write when streaming the GIF
+STREAM_CHUNK = 64 * 1024
+
+# segmented encoding: shortest segment in seconds and segments per
+# process (more segments than processes balance uneven keyframe cuts)
+MIN_SEGMENT = 4.0
+SEGMENTS_PER_PROCESS = 2
+
+# where the tools' own console output goes (None: inherit stdout); the CLI
+# points it at stderr when the GIF itself is written to stdout
+TOOL_STDOUT = None
+
+class ConversionError(Exception):
+    """A tool is missing or one of the yt-dlp/ffmpeg steps failed."""
 
 def die(msg, code=1):
-    print("ERROR:", msg, file=sys.stderr)
+    print(text("error"), msg, file=sys.stderr)
     sys.exit(code)
 
 def which(cmd):
     path = shutil.which(cmd)
     if not path:
-        die(f"'{cmd}' not found. Install with: sudo apt install {cmd}")
+        raise ConversionError(text("not_found", cmd=cmd))
     return path
 
+def call(cmd, **kw):
+    """Run cmd with progress reporting (see progress.py); returns its exit code."""
+    try:
+        return progress.call(cmd, **{"stdout": TOOL_STDOUT, **kw})
+    except progress.StallError as e:
+        raise ConversionError(str(e))
+
 def run(cmd, **kw):
     print("> " + " ".join(cmd))
-    res = subprocess.run(cmd, **kw)
-    if res.returncode != 0:
-        die(f"command failed: {' '.join(cmd)} (rc={res.returncode})")
+    rc = call(cmd, **kw)
+    if rc != 0:
+        raise ConversionError(text("command_failed", cmd=" ".join(cmd), rc=rc))
 
-def main():
-    if len(sys.argv) < 2:
-        print(__doc__)
-        sys.exit(0)
+def wait_watched(watcher):
+    """watcher.wait() of a progress.popen() process, as ConversionError."""
+    try:
+        return watcher.wait()
+    except progress.StallError as e:
+        raise ConversionError(str(e))
+
+def try_run(cmd, **kw):
+    """Like run(), but report failure by returning False instead of exiting."""
+    print("> " + " ".join(cmd))
+    return call(cmd, **kw) == 0
+
+def parse_time(value):
+    """Convert 'SS', 'MM:SS' or 'HH:MM:SS' (fractions allowed) to seconds."""
+    seconds = 0.0
+    for part in str(value).split(":"):
+        seconds = seconds * 60 + float(part)
+    return seconds
 
-    url      = sys.argv[1]
-    start    = sys.argv[2] if len(sys.argv) > 2 else "0"
-    duration = sys.argv[3] if len(sys.argv) > 3 else "5"
-    outgif   = sys.argv[4] if len(sys.argv) > 4 else "out.gif"
+def fmt_time(seconds):
+    """Format seconds the way ffmpeg expects them on the command line."""
+    return f"{seconds:.3f}"
 
-    yt       = which("yt-dlp")
-    ffmpeg   = which("ffmpeg")
+def probe_command(yt, url):
+    return [yt, "-J", "--no-playlist", url]
 
-    tmpdir = tempfile.mkdtemp(prefix="yt2gif_")
+def parse_info(output):
+    """Parse the output of probe_command() (empty dict if unusable)."""
     try:
-        mp4 = os.path.join(tmpdir, "video.mp4")
-        pal = os.path.join(tmpdir, "palette.png")
+        return json.loads(output)
+    except ValueError:
+        return {}
 
-        # 1) Download and merge best video+audio
-        run([yt,
-             "-f", "bestvideo[ext=mp4]+bestaudio[ext=m4a]/best",
-             "--merge-output-format", "mp4",
-             "-o", mp4,
-             url])
+def probe_info(yt, url):
+    """Return the yt-dlp info dict of url (empty on failure)."""
+    with metrics.stage("probe"):
+        res = subprocess.run(probe_command(yt, url), capture_output=True,
+                             text=True)
+    return parse_info(res.stdout) if res.returncode == 0 else {}
 
-        # 2) Generate palette
-        run([ffmpeg,
-             "-v", "warning",
-             "-ss", start,
-             "-t", duration,
-             "-i", mp4,
-             "-vf", "fps=10,scale=320:-1:flags=lanczos,palettegen",
-             "-y", pal])
+def download_command(yt, url, mp4, fmt="bestvideo/best"):
+    return [yt,
+            "-f", fmt,
+            "-o", mp4,
+            url]
+
+def download_full(yt, url, mp4, fmt="bestvideo/best"):
+    """Download the whole video stream (no audio, no merge) into mp4."""
+    run(download_command(yt, url, mp4, fmt))
+
+def section_command(ffmpeg, media_url, start, duration, mp4, pad=SECTION_PAD):
+    """
+    Return (cmd, offset): the ffmpeg command fetching only the byte ranges
+    of media_url covering [start, start+duration], padded by pad seconds on
+    both sides, without re-encoding, and the offset of start inside mp4.
+    """
+    fetch_start = max(0.0, start - pad)
+    cmd = [ffmpeg,
+           "-v", "warning",
+           "-ss", fmt_time(fetch_start),
+           "-i", media_url,
+           "-t", fmt_time(start - fetch_start + duration + pad),
+           "-map", "0:v:0",
+           "-c", "copy",
+           "-y", mp4]
+    return cmd, start - fetch_start
+
+def download_section(ffmpeg, media_url, start, duration, mp4, pad=SECTION_PAD):
+    """
+    Fetch only the part of media_url covering the slice (see section_command).
+    media_url may be any http(s) URL or local path ffmpeg can seek in.
+
+    Returns the offset of start inside mp4, or None if the section could
+    not be fetched (the caller should then fall back to a full download).
+    """
+    cmd, offset = section_command(ffmpeg, media_url, start, duration, mp4, pad)
+    ok = try_run(cmd)
+    if not ok or not os.path.exists(mp4) or os.path.getsize(mp4) == 0:
+        # yt-dlp would take a partial file left here as already downloaded
+        if os.path.exists(mp4):
+            os.remove(mp4)
+        return None
+    return offset
+
+def fetch_source(yt, ffmpeg, url, fmt, start, duration, mp4,
+                 full_download=False):
+    """
+    Put the video stream needed for the slice into mp4, preferring a
+    section download of fmt (a yt-dlp format dict, or None if unknown).
+    Returns the offset of start inside mp4.
+    """
+    with metrics.stage("download") as m:
+        offset = None
+        if fmt and not full_download and FormatPolicy.is_seekable(fmt):
+            offset = download_section(ffmpeg, fmt["url"], start, duration, mp4)
+            if offset is None:
+                print("Section download not available, downloading the full video")
+        if offset is None:
+            download_full(yt, url, mp4,
+                          fmt["format_id"] if fmt else "bestvideo/best")
+            offset = start
+        m["bytes_in"] = metrics.file_size(mp4)
+    return offset
 
+@contextlib.contextmanager
+def open_source(yt, ffmpeg, url, start, duration, tmpdir, full_download=False,
+                policy=None, cache=None, info=None):
+    """
+    Yield (path, offset) of a local video holding the slice, where offset
+    is the position of start inside it.
+
+    With cache (a cache.SourceCache) the whole video stream is downloaded
+    once into the cache and shared by later jobs; otherwise it is fetched
+    into tmpdir.
+    """
+    policy = policy or FormatPolicy()
+    info = probe_info(yt, url) if info is None else info
+    fmt = policy.select(info.get("formats") or [])
+    if cache is not None and fmt:
+        def fetch(tmp):
+            with metrics.stage("download") as m:
+                download_full(yt, url, tmp, fmt["format_id"])
+                m["bytes_in"] = metrics.file_size(tmp)
+        with cache.open(source_key(info, fmt), fetch) as path:
+            yield path, start
+        return
+    mp4 = os.path.join(tmpdir, "video.mp4")
+    yield mp4, fetch_source(yt, ffmpeg, url, fmt, start, duration, mp4,
+                            full_download=full_download)
+
+def thread_args(threads, complex_graph):
+    """ffmpeg options limiting decode and filter threads (none if unset)."""
+    if not threads:
+        return []
+    flag = "-filter_complex_threads" if complex_graph else "-filter_threads"
+    return [flag, str(threads), "-threads", str(threads)]
+
+# pal/outgif value of gif_commands() that streams through pipes instead
+PIPE = "pipe:"
+
+def input_args(mp4, start, duration, seek=None):
+    """
+    Return (ffmpeg input options, filter prefix) reading one slice of mp4.
+
+    Without seek ffmpeg's accurate input seeking is used. seek is a plan
+    from seeking.KeyframeIndex.plan(): the input is then opened exactly at
+    the keyframe preceding start and the clip is cut by a trim filter.
+    """
+    if seek is None:
+        return ["-ss", fmt_time(start),
+                "-t", fmt_time(duration),
+                "-i", mp4], ""
+    # aim just past the keyframe so rounding can never land on the one before
+    target = seek["keyframe"] + SEEK_EPSILON
+    preroll = max(0.0, seek["preroll"] - SEEK_EPSILON)
+    return ["-noaccurate_seek",
+            "-ss", f"{target:.6f}",
+            "-t", fmt_time(preroll + duration),
+            "-i", mp4], f"trim=start={preroll:.6f},setpts=PTS-STARTPTS,"
+
+def gif_commands(ffmpeg, mp4, start, duration, pal, outgif, two_pass=False,
+                 threads=None, seek=None, opts=None):
+    """
+    Return the ffmpeg commands encoding one slice of mp4 as a GIF.
+
+    By default each frame is decoded and scaled once and split between
+    palettegen and paletteuse in a single filter graph. With two_pass the
+    palette is written to pal first and the slice is decoded a second time.
+    threads caps the threads each ffmpeg process may use; seek is an
+    optional keyframe seek plan (see input_args()); opts are the
+    RenderOptions of the GIF (defaults if None).
+
+    With outgif=PIPE the GIF is written to stdout; with pal=PIPE the first
+    command writes the PNG palette to stdout and the second reads it from
+    stdin.
+    """
+    opts = opts or RenderOptions()
+    vf, gen, use = opts.video_filter(), opts.palettegen(), opts.paletteuse()
+    src, trim = input_args(mp4, start, duration, seek)
+    gif_out = ["-f", "gif", "pipe:1"] if outgif == PIPE else ["-y", outgif]
+    if not two_pass:
+        # 2+3) Generate the palette and create the GIF from one decode
+        return [[ffmpeg,
+                 "-v", "warning",
+                 *thread_args(threads, True),
+                 *src,
+                 "-filter_complex",
+                 f"{trim}{vf},split[a][b];[a]{gen}[p];[b][p]{use}",
+                 *gif_out]]
+
+    if pal == PIPE:
+        pal_out = ["-f", "image2pipe", "-c:v", "png", "pipe:1"]
+        pal_in = ["-f", "png_pipe", "-i", "pipe:0"]
+    else:
+        pal_out = ["-y", pal]
+        pal_in = ["-i", pal]
+    return [
+        # 2) Generate palette
+        [ffmpeg,
+         "-v", "warning",
+         *thread_args(threads, False),
+         *src,
+         "-vf", f"{trim}{vf},{gen}",
+         *pal_out],
         # 3) Create the GIF
+        [ffmpeg,
+         "-v", "warning",
+         *thread_args(threads, True),
+         *src,
+         *pal_in,
+         "-filter_complex", f"[0:v]{trim}{vf}[x];[x][1:v]{use}",
+         *gif_out],
+    ]
+
+def plan_seek(mp4, start):
+    """
+    Keyframe seek plan for start seconds into mp4, reporting its cost,
+    or None if ffprobe is missing or the keyframes are unknown.
+    """
+    ffprobe = shutil.which("ffprobe")
+    if not ffprobe:
+        return None
+    with metrics.stage("seek"):
+        plan = shared_index(ffprobe).plan(mp4, start)
+    if plan:
+        print(describe_seek(plan))
+    return plan
+
+def make_gif(ffmpeg, mp4, start, duration, pal, outgif, two_pass=False,
+             threads=None, seek=None, opts=None):
+    """Encode one slice of mp4 as a GIF with an optimized palette."""
+    if opts is not None and opts.encoder == "python":
+        return python_gif(ffmpeg, mp4, start, duration, outgif,
+                          threads=threads, seek=seek, opts=opts)
+    cmds = gif_commands(ffmpeg, mp4, start, duration, pal, outgif,
+                        two_pass=two_pass, threads=threads, seek=seek,
+                        opts=opts)
+    stages = [("palette", pal), ("encode", outgif)] if two_pass else [("render", outgif)]
+    for (name, output), cmd in zip(stages, cmds):
+        with metrics.stage(name) as m:
+            run(cmd)
+            m["bytes_out"] = metrics.file_size(output)
+
+def outputs_command(ffmpeg, mp4, start, duration, outputs, threads=None,
+                    seek=None, opts=None):
+    """
+    ffmpeg command rendering one slice of mp4 to every (path, format) of
+    outputs, decoding and scaling it only once (see renditions.py).
+    """
+    src, trim = input_args(mp4, start, duration, seek)
+    graph, out_args = renditions.output_graph(trim, opts, outputs)
+    return [ffmpeg,
+            "-v", "warning",
+            *thread_args(threads, True),
+            *src,
+            "-filter_complex", graph,
+            *out_args]
+
+def render_outputs(ffmpeg, mp4, start, duration, outputs, threads=None,
+                   seek=None, opts=None):
+    """Render one slice of mp4 to all outputs in one ffmpeg run."""
+    with metrics.stage("render") as m:
+        run(outputs_command(ffmpeg, mp4, start, duration, outputs,
+                            threads=threads, seek=seek, opts=opts))
+        m["bytes_out"] = sum(metrics.file_size(path) or 0 for path, _ in outputs)
+
+def joins_outputs(outputs, opts, two_pass=False, streaming=False,
+                  max_bytes=None, segmented=False, palette_reuse=False):
+    """
+    True if the GIF can be one more branch of the outputs' filter graph
+    (see render_outputs()): that takes a plain single-pass ffmpeg encode
+    written to a file, not any of the pipelines the flags select.
+    """
+    return bool(outputs) and opts.encoder == "ffmpeg" and \
+        not (two_pass or streaming or max_bytes or segmented or palette_reuse)
+
+# output of raw_frames_command(): headerless rgb24, or PPM images
+RAW_RGB = ["-f", "rawvideo", "-pix_fmt", "rgb24"]
+PPM = ["-f", "image2pipe", "-c:v", "ppm"]
+
+def raw_frames_command(ffmpeg, mp4, start, duration, threads=None, seek=None,
+                       opts=None, frames=None, fmt=RAW_RGB):
+    """
+    ffmpeg command decoding one slice of mp4 at the GIF's frame rate and
+    size into frames on stdout (at most frames of them), in fmt: raw
+    rgb24 by default.
+    """
+    opts = opts or RenderOptions()
+    src, trim = input_args(mp4, start, duration, seek)
+    limit = ["-frames:v", str(frames)] if frames else []
+    return [ffmpeg,
+            "-v", "warning",
+            *thread_args(threads, False),
+            *src,
+            "-vf", f"{trim}{opts.video_filter()}",
+            *limit,
+            *fmt,
+            "pipe:1"]
+
+def ppm_size(data):
+    """(width, height) from the header of a PPM image, or None."""
+    # a PPM header carries the size: "P6\n<width> <height>\n255\n"
+    fields = data[:32].split()
+    if len(fields) < 3 or fields[0] != b"P6":
+        return None
+    return int(fields[1]), int(fields[2])
+
+def frame_size(ffmpeg, mp4, start, duration, seek=None, opts=None):
+    """(width, height) of the scaled frames of a slice, from its first one."""
+    cmd = raw_frames_command(ffmpeg, mp4, start, duration, seek=seek,
+                             opts=opts, frames=1, fmt=PPM)
+    res = subprocess.run(cmd, capture_output=True)
+    size = ppm_size(res.stdout) if res.returncode == 0 else None
+    if size is None:
+        raise ConversionError(text("command_failed", cmd=" ".join(cmd),
+                                   rc=res.returncode))
+    return size
+
+def palette_sample_command(ffmpeg, mp4, start, duration, threads=None,
+                           seek=None, opts=None):
+    """raw_frames_command() of PALETTE_FRAMES frames spread over the slice."""
+    opts = opts or RenderOptions()
+    fps = min(opts.fps, PALETTE_FRAMES / max(duration, 0.001))
+    sampled = opts.replace(fps=fps)
+    return raw_frames_command(ffmpeg, mp4, start, duration, threads, seek,
+                              sampled, frames=PALETTE_FRAMES)
+
+def read_frames(stream, size):
+    """Yield the size-byte frames of a raw video stream."""
+    while True:
+        frame = stream.read(size)
+        if len(frame) < size:
+            return
+        yield frame
+
+def decode_frames(cmd, size, consume):
+    """
+    Run a raw_frames_command() and pass a generator of its size-byte
+    frames to consume(); returns what consume() returns.
+    """
+    print("> " + " ".join(cmd))
+    proc, watcher = progress.popen(cmd, stdout=subprocess.PIPE)
+    try:
+        result = consume(read_frames(proc.stdout, size))
+    except BaseException:
+        proc.kill()
+        raise
+    finally:
+        proc.stdout.close()
+        rc = wait_watched(watcher)
+    if rc != 0:
+        raise ConversionError(text("command_failed", cmd=" ".join(cmd), rc=rc))
+    return result
+
+def python_gif(ffmpeg, mp4, start, duration, outgif, threads=None, seek=None,
+               opts=None):
+    """
+    Encode one slice of mp4 with the in-process encoder of gifenc.py:
+    ffmpeg only decodes and scales, into raw rgb24 frames on a pipe. The
+    palette comes from PALETTE_FRAMES frames sampled first; the slice's
+    frames are then encoded as they arrive, so only a few are in memory.
+    outgif is a path or a binary writable.
+    """
+    opts = opts or RenderOptions()
+    width, height = frame_size(ffmpeg, mp4, start, duration, seek, opts)
+    size = width * height * 3
+    with metrics.stage("palette") as m:
+        cmd = palette_sample_command(ffmpeg, mp4, start, duration, threads,
+                                     seek, opts)
+        sample = decode_frames(cmd, size, list)
+        if not sample:
+            raise ConversionError(f"no frames decoded: {' '.join(cmd)}")
+        m["bytes_in"] = size * len(sample)
+        palette = gifenc.palette_for(sample, opts.max_colors)
+    del sample
+
+    def encode(out, frames):
+        encoder = gifenc.Encoder(out, width, height, opts.fps, palette)
+        count = 0
+        for frame in frames:
+            encoder.add(frame)
+            count += 1
+        encoder.close()
+        return count
+
+    cmd = raw_frames_command(ffmpeg, mp4, start, duration, threads, seek, opts)
+    with metrics.stage("encode") as m:
+        if hasattr(outgif, "write"):
+            out = CountingWriter(outgif)
+            count = decode_frames(cmd, size, lambda frames: encode(out, frames))
+            m["bytes_out"] = out.count
+        else:
+            with open(outgif, "wb") as f:
+                count = decode_frames(cmd, size,
+                                      lambda frames: encode(f, frames))
+            m["bytes_out"] = metrics.file_size(outgif)
+        m["bytes_in"] = size * count
+
+class CountingWriter:
+    """Binary writable passing writes on to out and counting the bytes."""
+
+    def __init__(self, out):
+        self.out = out
+        self.count = 0
+
+    def write(self, data):
+        self.count += len(data)
+        return self.out.write(data)
+
+def plan_segments(start, duration, count, fps, keyframes=None):
+    """
+    Split [start, start+duration] into at most count [(start, duration)]
+    segments of at least MIN_SEGMENT seconds. Cuts move to the nearest
+    keyframe if keyframes are given, then onto the GIF's frame grid so
+    the segments' frames line up.
+    """
+    count = max(1, min(count, int(duration // MIN_SEGMENT)))
+    end = start + duration
+    cuts = []
+    for i in range(1, count):
+        cut = start + duration * i / count
+        if keyframes:
+            cut = min(keyframes, key=lambda k: abs(k - cut))
+        cut = start + round((cut - start) * fps) / fps
+        if start < cut < end and (not cuts or cut > cuts[-1]):
+            cuts.append(cut)
+    bounds = [start] + cuts + [end]
+    return [(a, b - a) for a, b in zip(bounds, bounds[1:])]
+
+def keyframe_palette_command(ffmpeg, mp4, start, duration, pal, opts=None):
+    """
+    ffmpeg command generating the palette of a slice of mp4 from its
+    keyframes only: the decoder skips all other frames, so the pass costs
+    a fraction of a full decode of the slice.
+    """
+    opts = opts or RenderOptions()
+    return [ffmpeg,
+            "-v", "warning",
+            "-skip_frame", "nokey",
+            "-ss", fmt_time(start),
+            "-t", fmt_time(duration),
+            "-i", mp4,
+            "-vf", f"scale={opts.width}:-1:flags={opts.scaler},{opts.palettegen()}",
+            "-y", pal]
+
+def segmented_gif(ffmpeg, mp4, start, duration, outgif, processes, tmpdir,
+                  seek=None, opts=None):
+    """
+    Encode a long slice of mp4 in parallel: one palette is generated for
+    the whole slice (from its keyframes), the slice is cut at keyframes
+    into segments that separate ffmpeg processes encode with that
+    palette, and the segment GIFs are joined into outgif, a path or a
+    binary writable. A slice that yields a single segment is encoded
+    like any other, with the keyframe seek plan seek.
+    """
+    opts = opts or RenderOptions()
+    ffprobe = shutil.which("ffprobe")
+    keyframes = shared_index(ffprobe).keyframes(mp4) if ffprobe else None
+    segments = plan_segments(start, duration, processes * SEGMENTS_PER_PROCESS,
+                             opts.fps, keyframes)
+    pal = os.path.join(tmpdir, "palette.png")
+    if len(segments) < 2:
+        if hasattr(outgif, "write"):
+            stream_gif(ffmpeg, mp4, start, duration, outgif, seek=seek,
+                       opts=opts)
+        else:
+            make_gif(ffmpeg, mp4, start, duration, pal, outgif, seek=seek,
+                     opts=opts)
+        return
+    print(f"Segments: {len(segments)} on {processes} process(es)")
+
+    with metrics.stage("palette") as m:
+        # a slice shorter than a GOP may hold no keyframe at all
+        if not try_run(keyframe_palette_command(ffmpeg, mp4, start, duration,
+                                                pal, opts)) \
+                or not metrics.file_size(pal):
+            run(gif_commands(ffmpeg, mp4, start, duration, pal, PIPE,
+                             two_pass=True, seek=seek, opts=opts)[0])
+        m["bytes_out"] = metrics.file_size(pal)
+
+    paths = [os.path.join(tmpdir, f"segment_{i}.gif") for i in range(len(segments))]
+
+    def encode(i):
+        seg_start, seg_duration = segments[i]
+        run(gif_commands(ffmpeg, mp4, seg_start, seg_duration, pal, paths[i],
+                         two_pass=True, threads=1, opts=opts)[1])
+
+    with metrics.stage("encode") as m:
+        with ThreadPoolExecutor(processes) as pool:
+            list(pool.map(encode, range(len(segments))))
+        m["bytes_out"] = sum(metrics.file_size(p) or 0 for p in paths)
+
+    gifs = []
+    for path in paths:
+        with open(path, "rb") as f:
+            gifs.append(f.read())
+    with metrics.stage("concat") as m:
+        try:
+            if hasattr(outgif, "write"):
+                out = CountingWriter(outgif)
+                gifenc.concat(gifs, out)
+                m["bytes_out"] = out.count
+            else:
+                with open(outgif, "wb") as f:
+                    gifenc.concat(gifs, f)
+                m["bytes_out"] = metrics.file_size(outgif)
+        except (ValueError, IndexError) as e:
+            raise ConversionError(f"cannot join the segment GIFs: {e}")
+
+def signature_command(ffmpeg, mp4, start, duration, seek=None,
+                      keyframes=True):
+    """
+    ffmpeg command dumping tiny rgb24 frames of the slice for its color
+    signature. Only the keyframes inside the slice are decoded; with
+    keyframes=False just its first frame is, for slices shorter than a GOP.
+    """
+    if keyframes:
+        # the decoder drops the other frames before decoding them
+        src = ["-skip_frame", "nokey",
+               "-ss", fmt_time(start), "-t", fmt_time(duration), "-i", mp4]
+        trim, limit = "", []
+    else:
+        src, trim = input_args(mp4, start, duration, seek)
+        limit = ["-frames:v", "1"]
+    return [ffmpeg,
+            "-v", "warning",
+            *src,
+            "-vf", f"{trim}fps={palettes.SAMPLE_FPS},"
+                   f"scale={palettes.SAMPLE_WIDTH}:-1",
+            *limit,
+            "-f", "rawvideo", "-pix_fmt", "rgb24",
+            "pipe:1"]
+
+def signature(ffmpeg, mp4, start, duration, seek=None):
+    """Color histogram of a slice, for the palette library."""
+    with metrics.stage("signature"):
+        for keyframes in (True, False):
+            cmd = signature_command(ffmpeg, mp4, start, duration, seek,
+                                    keyframes=keyframes)
+            print("> " + " ".join(cmd))
+            res = subprocess.run(cmd, capture_output=True)
+            if res.returncode != 0:
+                raise ConversionError(text("command_failed", cmd=" ".join(cmd),
+                                           rc=res.returncode))
+            if res.stdout:
+                break
+    return palettes.histogram(res.stdout)
+
+def make_gif_from_library(ffmpeg, mp4, start, duration, outgif, library,
+                          threads=None, seek=None, opts=None):
+    """
+    Encode one slice of mp4 reusing the closest palette of library (a
+    palettes.PaletteLibrary), so only paletteuse runs. If no stored palette
+    is close enough in color, one is generated in the same decode as the
+    GIF and added to the library. The python encoder makes its own
+    palette, so the library is not used with it.
+    """
+    if opts is not None and opts.encoder == "python":
+        return python_gif(ffmpeg, mp4, start, duration, outgif,
+                          threads=threads, seek=seek, opts=opts)
+    hist = signature(ffmpeg, mp4, start, duration, seek)
+
+    opts = opts or RenderOptions()
+    pal, dist = library.lookup(hist, opts.palette_key())
+    if pal:
+        print(f"Palette: reusing {os.path.basename(pal)} (distance {dist:.3f})")
+        with metrics.stage("encode") as m:
+            run(gif_commands(ffmpeg, mp4, start, duration, pal, outgif,
+                             two_pass=True, threads=threads, seek=seek,
+                             opts=opts)[1])
+            m["bytes_out"] = metrics.file_size(outgif)
+        return
+
+    print(f"Palette: generating a new one (closest distance {dist:.3f})")
+    pal = library.new_palette_path()
+    src, trim = input_args(mp4, start, duration, seek)
+    with metrics.stage("render") as m:
         run([ffmpeg,
              "-v", "warning",
-             "-ss", start,
-             "-t", duration,
-             "-i", mp4,
-             "-i", pal,
-             "-filter_complex", "fps=10,scale=320:-1:flags=lanczos[x];[x][1:v]paletteuse",
-             "-y", outgif])
+             *thread_args(threads, True),
+             *src,
+             "-filter_complex",
+             f"{trim}{opts.video_filter()},split[a][b];"
+             f"[a]{opts.palettegen()},split[p][q];[b][p]{opts.paletteuse()}[gif]",
+             "-map", "[gif]", "-y", outgif,
+             "-map", "[q]", "-update", "1", "-y", pal])
+        m["bytes_out"] = metrics.file_size(outgif)
+    library.add(start, start + duration, hist, opts.palette_key(), pal)
+
+def stream_gif(ffmpeg, mp4, start, duration, out, two_pass=False,
+               threads=None, seek=None, opts=None, chunk_size=STREAM_CHUNK):
+    """
+    Encode one slice of mp4 and write the GIF to the binary writable out
+    as ffmpeg produces it. Nothing is written to disk: with two_pass the
+    palette is kept in memory and piped into the second ffmpeg.
+    """
+    if opts is not None and opts.encoder == "python":
+        return python_gif(ffmpeg, mp4, start, duration, out,
+                          threads=threads, seek=seek, opts=opts)
+    cmds = gif_commands(ffmpeg, mp4, start, duration, PIPE, PIPE,
+                        two_pass=two_pass, threads=threads, seek=seek,
+                        opts=opts)
+    palette = None
+    if two_pass:
+        print("> " + " ".join(cmds[0]))
+        with metrics.stage("palette") as m:
+            res = subprocess.run(cmds[0], capture_output=True)
+            if res.returncode != 0:
+                raise ConversionError(text("command_failed",
+                                           cmd=" ".join(cmds[0]),
+                                           rc=res.returncode))
+            palette = res.stdout
+            m["bytes_out"] = len(palette)
+
+    cmd = cmds[-1]
+    print("> " + " ".join(cmd))
+    with metrics.stage("encode" if two_pass else "render") as m:
+        m["bytes_out"] = 0
+        proc, watcher = progress.popen(
+            cmd, stdin=subprocess.PIPE if palette else subprocess.DEVNULL,
+            stdout=subprocess.PIPE)
+        try:
+            if palette:
+                # a palette PNG is a few KB, it fits in the pipe buffer
+                proc.stdin.write(palette)
+                proc.stdin.close()
+            for chunk in iter(lambda: proc.stdout.read(chunk_size), b""):
+                out.write(chunk)
+                m["bytes_out"] += len(chunk)
+        except BaseException:
+            proc.kill()
+            raise
+        finally:
+            proc.stdout.close()
+            rc = wait_watched(watcher)
+        if rc != 0:
+            raise ConversionError(text("command_failed", cmd=" ".join(cmd),
+                                       rc=rc))
+
+def pipe_command(yt, url, fmt="bestvideo/best"):
+    """yt-dlp command writing the (single-file) format to stdout."""
+    return [yt,
+            "--no-progress",
+            "-f", fmt,
+            "-o", "-",
+            url]
+
+def relay(src, dst, chunk_size=STREAM_CHUNK, on_chunk=None):
+    """
+    Copy src to dst until EOF, then close dst. Blocking writes into the
+    bounded pipe give natural backpressure. on_chunk(size) is called after
+    every chunk written. Returns False if the reader closed dst first (e.g.
+    ffmpeg had all the frames it needed).
+    """
+    try:
+        for chunk in iter(lambda: src.read(chunk_size), b""):
+            dst.write(chunk)
+            if on_chunk:
+                on_chunk(len(chunk))
+        return True
+    except BrokenPipeError:
+        return False
+    finally:
+        try:
+            dst.close()
+        except BrokenPipeError:
+            pass
+
+def piped_gif(yt, ffmpeg, url, fmt, start, duration, outgif, threads=None,
+              opts=None):
+    """
+    Encode the slice while it is being downloaded: yt-dlp writes format
+    fmt to a pipe that feeds ffmpeg's stdin, so no intermediate video file
+    exists and encoding starts with the first downloaded bytes. outgif is
+    a path or a binary writable. Always single-pass (stdin can only be
+    decoded once).
+
+    Raises ConversionError if ffmpeg fails, or if yt-dlp fails before
+    ffmpeg has read everything it needed.
+    """
+    dl_cmd = pipe_command(yt, url, fmt)
+    streaming = hasattr(outgif, "write")
+    cmd = gif_commands(ffmpeg, "pipe:0", start, duration, None,
+                       PIPE if streaming else outgif, threads=threads,
+                       opts=opts)[0]
+    print("> " + " ".join(dl_cmd) + " | " + " ".join(cmd))
+    with metrics.stage("piped") as m:
+        m["bytes_in"] = m["bytes_out"] = 0
+        def count_in(n):
+            m["bytes_in"] += n
+        dl = subprocess.Popen(dl_cmd, stdin=subprocess.DEVNULL,
+                              stdout=subprocess.PIPE)
+        enc, watcher = progress.popen(
+            cmd, stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE if streaming else TOOL_STDOUT)
+        completed = []
+        pump = threading.Thread(
+            target=lambda: completed.append(relay(dl.stdout, enc.stdin,
+                                                  on_chunk=count_in)),
+            daemon=True)
+        pump.start()
+        try:
+            if streaming:
+                for chunk in iter(lambda: enc.stdout.read(STREAM_CHUNK), b""):
+                    outgif.write(chunk)
+                    m["bytes_out"] += len(chunk)
+                enc.stdout.close()
+            rc = wait_watched(watcher)
+        except BaseException:
+            enc.kill()
+            dl.kill()
+            raise
+        finally:
+            # once ffmpeg is done the rest of the video is not needed
+            stopped = dl.poll() is None
+            if stopped:
+                dl.kill()
+            pump.join()
+            dl.wait()
+            dl.stdout.close()
+
+        if not streaming:
+            m["bytes_out"] = metrics.file_size(outgif)
+        if rc != 0:
+            raise ConversionError(text("command_failed", cmd=" ".join(cmd),
+                                       rc=rc))
+        if not stopped and completed == [True] and dl.returncode != 0:
+            raise ConversionError(text("command_failed", cmd=" ".join(dl_cmd),
+                                       rc=dl.returncode))
+
+def fit_budget(ffmpeg, mp4, start, duration, outgif, max_bytes, opts, tmpdir,
+               threads=None, seek=None):
+    """
+    Encode one slice of mp4 into at most max_bytes, lowering fps, width,
+    colors and dithering from opts as little as possible (see budget.py).
+    outgif is a path or a binary writable. Returns the budget.fit() result.
+    """
+    pal = os.path.join(tmpdir, "budget_palette.png")
+
+    def encode(trial_opts, trial_duration, path):
+        make_gif(ffmpeg, mp4, start, trial_duration, pal, path,
+                 threads=threads, seek=seek, opts=trial_opts)
+
+    result = budget.fit(encode, duration, max_bytes, opts, tmpdir)
+    if not result["fits"]:
+        raise ConversionError(f"cannot fit the GIF into {max_bytes} bytes "
+                              f"(smallest attempt: {result['size']} bytes "
+                              f"with {result['opts']})")
+    print(f"Budget: {result['size']} bytes with {result['opts']} "
+          f"after {result['trials']} trial encode(s)")
+    if hasattr(outgif, "write"):
+        with open(result["path"], "rb") as f:
+            shutil.copyfileobj(f, outgif)
+    else:
+        shutil.move(result["path"], outgif)
+    return result
+
+def clear_dir(path):
+    """Remove everything inside path, keeping the directory itself."""
+    for name in os.listdir(path):
+        entry = os.path.join(path, name)
+        if os.path.isdir(entry) and not os.path.islink(entry):
+            shutil.rmtree(entry, ignore_errors=True)
+        else:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(entry)
+
+def add_cache_arguments(parser):
+    """Add the --cache-dir family of options shared by all entry points."""
+    parser.add_argument("--cache-dir", nargs="?", const=default_cache_dir(),
+                        help="keep downloaded videos and GIFs in a shared cache "
+                             f"(default dir: {default_cache_dir()})")
+    parser.add_argument("--cache-size", type=size_argument, default="2G",
+                        help="maximum size of the video cache, e.g. 500M (default: 2G)")
+    parser.add_argument("--result-cache-size", type=size_argument,
+                        default="500M",
+                        help="maximum size of the GIF cache (default: 500M)")
+    parser.add_argument("--result-ttl", type=float,
+                        help="seconds a cached GIF stays valid (default: forever)")
+
+def open_caches(args):
+    """Return (SourceCache, ResultCache) for parsed args, or (None, None)."""
+    if not args.cache_dir:
+        return None, None
+    return (SourceCache(os.path.join(args.cache_dir, "sources"),
+                        args.cache_size),
+            ResultCache(os.path.join(args.cache_dir, "results"),
+                        args.result_cache_size,
+                        ttl=args.result_ttl))
+
+def render_params(url, start, duration, two_pass=False, opts=None,
+                  max_bytes=None, parallel=None, palette_threshold=None,
+                  keyframe_seek=True):
+    """Everything that determines the output GIF, for the result cache."""
+    return {
+        "url": url,
+        "start": start,
+        "duration": duration,
+        "two_pass": two_pass,
+        "max_bytes": max_bytes,
+        # a reused palette gives a different GIF than one of its own
+        "palette_threshold": palette_threshold,
+        "keyframe_seek": keyframe_seek,
+        # one process encodes like the default pipeline
+        "parallel": parallel if parallel and parallel > 1 else None,
+        **(opts or RenderOptions()).as_dict(),
+    }
+
+def add_language_argument(parser):
+    parser.add_argument("--lang", "-l", choices=messages.LANGUAGES,
+                        default=messages.DEFAULT_LANGUAGE,
+                        help="language of the messages (default: english)")
+
+def main(argv=None, prog="youtube2gif.py"):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv:
+        print(__doc__)
+        sys.exit(0)
+
+    # the language is needed before the help texts are built
+    pre = argparse.ArgumentParser(add_help=False)
+    add_language_argument(pre)
+    messages.use(pre.parse_known_args(argv)[0].lang)
+
+    parser = argparse.ArgumentParser(
+        prog=prog,
+        description=text("description"),
+        epilog=f"{text('dependencies')}\n    sudo apt install yt-dlp ffmpeg",
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_language_argument(parser)
+    parser.add_argument("url")
+    parser.add_argument("start", nargs="?", default="0")
+    parser.add_argument("duration", nargs="?", default="5")
+    parser.add_argument("output", nargs="?", default="out.gif",
+                        help="output GIF, or - to stream it to stdout")
+    parser.add_argument("--full", action="store_true",
+                        help="convert to the end of the video (ignores the duration)")
+    parser.add_argument("--output", dest="output_file", metavar="FILE",
+                        help="output GIF, instead of the output argument")
+    parser.add_argument("--full-download", action="store_true",
+                        help="download the whole video instead of only the slice")
+    parser.add_argument("--two-pass", action="store_true",
+                        help="decode the slice twice (palette file, then GIF)")
+    parser.add_argument("--threads", type=int,
+                        help="maximum threads per ffmpeg process (default: ffmpeg's choice)")
+    parser.add_argument("--no-keyframe-seek", action="store_true",
+                        help="let ffmpeg seek on its own instead of using a keyframe index")
+    parser.add_argument("--palette-reuse", type=float, nargs="?",
+                        const=palettes.DEFAULT_THRESHOLD, metavar="THRESHOLD",
+                        help="with --cache-dir, reuse palettes of earlier clips whose "
+                             "colors differ by at most THRESHOLD (0-1, default "
+                             f"{palettes.DEFAULT_THRESHOLD})")
+    parser.add_argument("--max-bytes", type=size_argument, metavar="SIZE",
+                        help="lower fps/width/colors/dithering until the GIF fits "
+                             "into SIZE, e.g. 2M")
+    parser.add_argument("--pipe", action="store_true",
+                        help="pipe yt-dlp into ffmpeg and encode while downloading")
+    parser.add_argument("--parallel", type=int, metavar="N",
+                        help="encode long slices in N ffmpeg processes at once, "
+                             "cut at keyframes and sharing one palette")
+    parser.add_argument("--outputs", metavar="FILE,...",
+                        help="also render these .webp, .png (APNG) or .mp4 files "
+                             "from the same decode as the GIF")
+    add_render_arguments(parser)
+    add_cache_arguments(parser)
+    metrics.add_arguments(parser)
+    progress.add_arguments(parser)
+    args = parser.parse_args(argv)
+    try:
+        outputs = renditions.parse_outputs(args.outputs)
+    except ValueError as e:
+        parser.error(str(e))
+    metrics.install_from_args(args)
+    progress.install_from_args(args)
+
+    if args.output_file:
+        args.output = args.output_file
+    output = args.output
+    if output == "-":
+        global TOOL_STDOUT
+        output = sys.stdout.buffer
+        # keep messages and the tools' output off the GIF stream
+        sys.stdout = TOOL_STDOUT = sys.stderr
+
+    try:
+        cache, results = open_caches(args)
+        with metrics.job(args.output):
+            convert(args.url, parse_time(args.start),
+                    None if args.full else parse_time(args.duration),
+                    output,
+                    two_pass=args.two_pass, threads=args.threads,
+                    full_download=args.full_download, cache=cache,
+                    results=results, pipe=args.pipe,
+                    keyframe_seek=not args.no_keyframe_seek,
+                    palette_threshold=args.palette_reuse, opts=from_args(args),
+                    max_bytes=args.max_bytes,
+                    parallel=args.parallel, outputs=outputs)
+    except ConversionError as e:
+        die(e)
+
+    print("\n✔ " + text("saved", path="stdout" if args.output == "-" else args.output))
+    for path, _ in outputs:
+        print(f"✔ {path}")
+
+def convert(url, start=0.0, duration=5.0, outgif="out.gif", two_pass=False,
+            threads=None, full_download=False, cache=None, results=None,
+            pipe=False, keyframe_seek=True, palette_threshold=None,
+            opts=None, max_bytes=None, parallel=None, outputs=None, yt=None,
+            ffmpeg=None, tmpdir=None):
+    """
+    Convert [start, start+duration] seconds of url into outgif, a path or
+    a binary writable the GIF is streamed into as it is encoded; with
+    duration None up to the end of the video.
+    cache and results are the optional SourceCache and ResultCache; with
+    pipe the video is not stored at all but piped from yt-dlp to ffmpeg
+    (see piped_gif()). keyframe_seek enables the keyframe index based
+    seeking of seeking.py when ffprobe is available. With a cache and a
+    palette_threshold, palettes are reused across clips of the same video
+    (see make_gif_from_library()). opts are the RenderOptions; with
+    max_bytes they are lowered as needed to fit the GIF into that size
+    (see budget.py). With parallel > 1 the slice is encoded by that many
+    ffmpeg processes at once (see segmented_gif()). outputs are further
+    (path, format) files of the slice (see renditions.parse_outputs()),
+    rendered from the GIF's decode when the GIF is a plain single-pass
+    ffmpeg encode (see joins_outputs()), else from one decode of their
+    own; the result cache is not used for them. A long-running caller may
+    pass the yt and ffmpeg paths to skip the PATH lookups, and a scratch
+    tmpdir of its own, which is emptied afterwards instead of being
+    created and removed per call.
+    Raises ConversionError if a tool is missing or a step fails.
+    """
+    opts = opts or RenderOptions()
+    streaming = hasattr(outgif, "write")
+    outputs = outputs or []
+    if outputs:
+        # the result cache only holds GIFs
+        results = None
+    if results is not None:
+        # palettes are only reused with a source cache
+        params = render_params(url, start, duration, two_pass, opts,
+                               max_bytes, parallel,
+                               palette_threshold if cache is not None else None,
+                               keyframe_seek)
+        hit = results.get(params)
+        stats = results.stats()
+        print(f"Result cache: {'hit' if hit else 'miss'} "
+              f"({stats['hits']} hits, {stats['misses']} misses)")
+        if hit and streaming:
+            with open(hit, "rb") as f:
+                shutil.copyfileobj(f, outgif)
+            return
+        if hit:
+            shutil.copyfile(hit, outgif)
+            return
+
+    yt     = yt or which("yt-dlp")
+    ffmpeg = ffmpeg or which("ffmpeg")
+    policy = FormatPolicy(target_width=opts.width)
+    info = None
+    if duration is None:
+        info = probe_info(yt, url)
+        if not info.get("duration"):
+            raise ConversionError(f"cannot find the length of {url}; "
+                                  "give a duration instead")
+        duration = max(0.0, float(info["duration"]) - start)
+        print(f"Full video: {fmt_time(start)}s to {fmt_time(start + duration)}s")
+
+    # a slice too short for two segments is encoded in one process
+    segmented = parallel and parallel > 1 and opts.encoder == "ffmpeg" \
+        and duration >= 2 * MIN_SEGMENT
+    if pipe and not max_bytes and not segmented and not outputs \
+            and opts.encoder == "ffmpeg":
+        info = info or probe_info(yt, url)
+        fmt = policy.select(info.get("formats") or [])
+        piped_gif(yt, ffmpeg, url, fmt["format_id"] if fmt else "bestvideo/best",
+                  start, duration, outgif, threads=threads, opts=opts)
+        if results is not None and not streaming:
+            results.put(params, outgif)
+        return
+
+    scratch = tmpdir
+    tmpdir = scratch or tempfile.mkdtemp(prefix="yt2gif_")
+    try:
+        pal = os.path.join(tmpdir, "palette.png")
 
-        print(f"\n✔ GIF saved to: {outgif}")
+        # 1) Download the slice (or the whole video as a fallback)
+        with open_source(yt, ffmpeg, url, start, duration, tmpdir,
+                         full_download=full_download, policy=policy,
+                         cache=cache, info=info) as (mp4, offset):
+            seek = plan_seek(mp4, offset) if keyframe_seek else None
+            shared = joins_outputs(outputs, opts, two_pass, streaming,
+                                   max_bytes, segmented,
+                                   palette_threshold is not None
+                                   and cache is not None)
+            if shared:
+                render_outputs(ffmpeg, mp4, offset, duration,
+                               [(outgif, "gif")] + outputs, threads=threads,
+                               seek=seek, opts=opts)
+            elif max_bytes:
+                fit_budget(ffmpeg, mp4, offset, duration, outgif, max_bytes,
+                           opts, tmpdir, threads=threads, seek=seek)
+            elif segmented:
+                segmented_gif(ffmpeg, mp4, offset, duration, outgif, parallel,
+                              tmpdir, seek=seek, opts=opts)
+            elif palette_threshold is not None and cache is not None \
+                    and not streaming:
+                library = palettes.PaletteLibrary(palettes.library_dir(mp4),
+                                                  palette_threshold)
+                make_gif_from_library(ffmpeg, mp4, offset, duration, outgif,
+                                      library, threads=threads, seek=seek,
+                                      opts=opts)
+            elif streaming:
+                stream_gif(ffmpeg, mp4, offset, duration, outgif,
+                           two_pass=two_pass, threads=threads, seek=seek,
+                           opts=opts)
+            else:
+                make_gif(ffmpeg, mp4, offset, duration, pal, outgif,
+                         two_pass=two_pass, threads=threads, seek=seek,
+                         opts=opts)
+            if outputs and not shared:
+                render_outputs(ffmpeg, mp4, offset, duration, outputs,
+                               threads=threads, seek=seek, opts=opts)
+        if results is not None and not streaming:
+            results.put(params, outgif)
 
     finally:
-        shutil.rmtree(tmpdir, ignore_errors=True)
+        if scratch:
+            clear_dir(scratch)
+        else:
+            shutil.rmtree(tmpdir, ignore_errors=True)
 
 if __name__ == "__main__":
     main()